@@ -7,6 +7,7 @@ Direct SQL queries, no authentication checks, minimal overhead
 import os
 from flask import Flask, jsonify
 from flask_cors import CORS
+from werkzeug.serving import is_running_from_reloader
 import psycopg2
 from psycopg2.pool import SimpleConnectionPool
 
@@ -34,10 +35,26 @@ db_pool = SimpleConnectionPool(
 # Make pool available to blueprints
 app.db_pool = db_pool
 
+# Load the product catalog into memory (refreshed when catalog_version is bumped)
+from catalog import ProductCatalog
+app.catalog = ProductCatalog(db_pool)
+app.catalog.load()
+
 # Initialize ML engine
 from ml_engine import get_engine
 app.ml_engine = get_engine()
 
+# Per-user prediction response cache (invalidated when the user places an order)
+from prediction_cache import PredictionCache
+app.prediction_cache = PredictionCache(
+    max_size=int(os.getenv('PREDICTION_CACHE_SIZE', '10000')),
+    ttl_seconds=float(os.getenv('PREDICTION_CACHE_TTL_SECONDS', '3600'))
+)
+
+# Background jobs of the admin endpoints (evaluation, seeding, vector pre-computation)
+from jobs import JobRegistry
+app.jobs = JobRegistry(app)
+
 # Import endpoint modules
 from endpoints.auth import auth_bp
 from endpoints.predictions import predictions_bp
@@ -47,6 +64,9 @@ from endpoints.products import products_bp
 from endpoints.orders import orders_bp
 from endpoints.user import user_bp
 from endpoints.favorites import favorites_bp
+from endpoints.jobs import jobs_bp
+from endpoints.engine import engine_bp, retire_predictions, submit_precompute_job
+from endpoints.predictions import submit_basket_precompute_job
 
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -57,6 +77,35 @@ app.register_blueprint(products_bp, url_prefix='/api/products')
 app.register_blueprint(orders_bp, url_prefix='/api/orders')
 app.register_blueprint(user_bp, url_prefix='/api/user')
 app.register_blueprint(favorites_bp, url_prefix='/api/favorites')
+app.register_blueprint(jobs_bp, url_prefix='/api/admin/jobs')
+app.register_blueprint(engine_bp, url_prefix='/api/admin/engine')
+
+# Predictions of a swapped-out generation are dropped, whatever triggered the swap
+def retire_swapped_predictions(generation, previous):
+    with app.app_context():
+        retire_predictions()
+
+app.ml_engine.activation_listeners.append(retire_swapped_predictions)
+
+def start_background_work():
+    """
+    Background work of the process that serves the requests, started once:
+    the vector store watch, the rebuild of vectors built with other parameters and
+    the predicted baskets of the active users
+    """
+    # Hot reload the recommender vectors when an offline pre-computation replaces them
+    app.ml_engine.watch_recommender_vectors()
+
+    # Stored vectors built with other parameters are served until rebuilt in the background
+    if app.ml_engine.pending_params is not None:
+        with app.app_context():
+            rebuild_job = submit_precompute_job()
+        print(f"🔄 Rebuilding recommender vectors for the configured parameters (job {rebuild_job.id})")
+
+    # Refresh the stored predicted baskets off the request path, live predictions are served meanwhile
+    with app.app_context():
+        basket_job = submit_basket_precompute_job()
+    print(f"🧺 Pre-computing predicted baskets for active users in the background (job {basket_job.id})")
 
 # Health check
 @app.route('/api/health', methods=['GET'])
@@ -101,4 +150,11 @@ def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # debug=True runs the app under the Werkzeug reloader: this module is also executed by
+    # the parent process, which only watches the sources and never serves, so the
+    # background work starts in the serving child alone
+    if is_running_from_reloader():
+        start_background_work()
+    app.run(host='0.0.0.0', port=5000, debug=True)
+else:
+    start_background_work()
@@ -0,0 +1,208 @@
+# backend/catalog.py
+"""
+Product hydration shared by the endpoints
+Turns lists of product ids into product JSON with a single query, or without
+any query through the process-local ProductCatalog (app.catalog)
+"""
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import psycopg2.extras
+
+CATALOG_VERSION_CHECK_SECONDS = float(os.getenv('CATALOG_VERSION_CHECK_SECONDS', '30')) # How often catalog_version is polled
+MAX_UNKNOWN_PRODUCT_IDS = 10000 # Ids remembered as not in the products table, until the next catalog load
+
+PRODUCT_QUERY = """
+    SELECT p.*, c.name as category_name, c.image_url as category_image
+    FROM products p
+    JOIN categories c ON p.department_id = c.department_id
+"""
+
+
+def format_product(product):
+    """Format product row (PRODUCT_QUERY columns) for response"""
+    return {
+        'id': str(product['instacart_product_id']),
+        'sku': f"SKU-{product['instacart_product_id']}",
+        'name': product['name'],
+        'description': product['description'],
+        'price': float(product['price']),
+        'brand': product['brand'],
+        'imageUrl': product['image_url'] or product['category_image'],
+        'category': {
+            'id': str(product['department_id']),
+            'name': product['category_name']
+        },
+        'stock': 100,  # Default stock
+        'isActive': product['is_active'],
+        'metadata': {}
+    }
+
+
+def fetch_products(cur, product_ids: Iterable[int]) -> Dict[int, Dict]:
+    """
+    Product rows by id in one query, unknown ids are left out
+    """
+    product_ids = list({int(product_id) for product_id in product_ids})
+    if not product_ids:
+        return {}
+    cur.execute(PRODUCT_QUERY + " WHERE p.instacart_product_id = ANY(%s)", [product_ids])
+    return {product['instacart_product_id']: product for product in cur.fetchall()}
+
+
+def format_category(category):
+    """Format category row for response"""
+    return {
+        'id': str(category['department_id']),
+        'name': category['name'],
+        'description': category['description'],
+        'imageUrl': category['image_url']
+    }
+
+
+class ProductCatalog:
+    """
+    Process-local copy of the products and categories tables, which are written
+    once by populate_db.py and read-only afterwards. Products are kept already
+    formatted (id -> product JSON), active categories as their serialized list.
+    Every writer bumps catalog_version; the catalog polls that single row at most
+    every CATALOG_VERSION_CHECK_SECONDS and reloads itself when it moved, so
+    lookups themselves never touch PostgreSQL. Ids fetched and not found are
+    remembered as unknown until that reload, so stale favorites or cart ids do
+    not cost a query on every request.
+    """
+
+    def __init__(self, db_pool, check_interval_seconds: float = CATALOG_VERSION_CHECK_SECONDS):
+        self.db_pool = db_pool
+        self.check_interval_seconds = check_interval_seconds
+        self.products = {}
+        self.unknown_ids = set()
+        self.categories = []
+        self.version = None
+        self.loaded_at = None
+        self.load_seconds = 0.0
+        self.refreshes = 0
+        self.hits = 0
+        self.misses = 0
+        self.unknown_hits = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _query(self, query, params=None):
+        conn = self.db_pool.getconn()
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                cur.execute(query, params or [])
+                rows = cur.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            self.db_pool.putconn(conn)
+
+    def _current_version(self) -> int:
+        rows = self._query("SELECT version FROM catalog_version")
+        return rows[0]['version'] if rows else 0
+
+    def load(self):
+        """Load (or reload) the whole catalog, readers keep the old maps until the swap"""
+        with self._lock:
+            started = time.perf_counter()
+            version = self._current_version()
+            products = {product['instacart_product_id']: format_product(product)
+                        for product in self._query(PRODUCT_QUERY)}
+            categories = [format_category(category) for category in self._query("""
+                SELECT department_id, name, description, image_url, is_active
+                FROM categories
+                WHERE is_active = true
+                ORDER BY name
+            """)]
+
+            self.products, self.categories, self.version = products, categories, version
+            self.unknown_ids = set()
+            self.loaded_at = time.time()
+            self.load_seconds = time.perf_counter() - started
+            self.refreshes += 1
+            self._checked_at = time.monotonic()
+        print(f"✅ Loaded product catalog v{version}: {len(products)} products, {len(categories)} categories "
+              f"in {self.load_seconds:.2f}s")
+
+    def bump_version(self):
+        """Announce a catalog change to every process (admin refresh)"""
+        conn = self.db_pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP")
+            conn.commit()
+        finally:
+            self.db_pool.putconn(conn)
+
+    def _refresh_if_stale(self):
+        """Reload when catalog_version moved, checked at most every check_interval_seconds"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval_seconds:
+            return
+        self._checked_at = now
+        try:
+            if self._current_version() != self.version:
+                self.load()
+        except Exception as e:
+            print(f"Catalog version check error: {str(e)}")
+
+    def product(self, product_id) -> Optional[Dict]:
+        """Product JSON by id, None when unknown"""
+        products = self.hydrate([product_id])
+        return products[0] if products else None
+
+    def hydrate(self, product_ids: Iterable[int]) -> List[Dict]:
+        """
+        Product JSON for the given ids in their given (ranking) order, unknown ids are skipped.
+        Ids missing from the catalog (added since the last load) are fetched with one query,
+        ids already known not to exist are skipped without one.
+        """
+        self._refresh_if_stale()
+        product_ids = [int(product_id) for product_id in product_ids]
+        products, unknown_ids = self.products, self.unknown_ids
+        absent = [product_id for product_id in product_ids if product_id not in products]
+        missing = [product_id for product_id in absent if product_id not in unknown_ids]
+        self.hits += len(product_ids) - len(absent)
+        self.unknown_hits += len(absent) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            products = {**products, **self._fetch(missing)}
+        return [products[product_id] for product_id in product_ids if product_id in products]
+
+    def _fetch(self, product_ids: List[int]) -> Dict[int, Dict]:
+        conn = self.db_pool.getconn()
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                rows = fetch_products(cur, product_ids)
+            conn.commit()
+        finally:
+            self.db_pool.putconn(conn)
+        fetched = {product_id: format_product(row) for product_id, row in rows.items()}
+        self.products.update(fetched)
+        if len(self.unknown_ids) >= MAX_UNKNOWN_PRODUCT_IDS:
+            self.unknown_ids = set()
+        self.unknown_ids.update(product_id for product_id in product_ids if product_id not in fetched)
+        return fetched
+
+    def get_categories(self) -> List[Dict]:
+        self._refresh_if_stale()
+        return self.categories
+
+    def stats(self) -> Dict:
+        return {
+            'version': self.version,
+            'products': len(self.products),
+            'categories': len(self.categories),
+            'loadedAt': self.loaded_at,
+            'loadSeconds': round(self.load_seconds, 3),
+            'refreshes': self.refreshes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'unknownIds': len(self.unknown_ids),
+            'unknownHits': self.unknown_hits
+        }
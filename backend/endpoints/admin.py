@@ -5,8 +5,11 @@ Admin endpoints for demo user creation and model evaluation
 
 from flask import Blueprint, request, jsonify, current_app
 from database import execute_query, get_db_cursor
+from ml_engine import DATABASE_CONFIG
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
 from passlib.hash import bcrypt
-import pandas as pd
 import os
 import random
 import string
@@ -15,6 +18,10 @@ from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__)
 
+SEED_BATCH_SIZE = 100 # Users seeded per transaction by the bulk seeding job
+SEED_WORKERS = int(os.getenv('SEED_WORKERS', '4')) # Batches seeded in parallel (bcrypt hashing dominates)
+MAX_SEED_USERS = 50000 # Upper bound of users per bulk seeding request
+
 
 @admin_bp.route('/demo/seed-user/<string:instacart_user_id>', methods=['POST'])
 def seed_demo_user(instacart_user_id):
@@ -23,8 +30,22 @@ def seed_demo_user(instacart_user_id):
     Credentials form:
         - email : demo<id>@timely.com
         - password : demo_<id>
+    With ?async=true the user is seeded by a background job (see /demo/seed-users)
     """
     try:
+        # Validate user_id and convert to int
+        try:
+            instacart_user_id_int = int(instacart_user_id)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid user ID'}), 400
+        
+        if request.args.get('async', 'false').lower() == 'true':
+            response, status = submit_seed_job({'userIds': [instacart_user_id_int], 'batchSize': 1})
+            if status == 202:
+                email, password = demo_credentials(instacart_user_id_int)
+                response['credentials'] = {'email': email, 'password': password}
+            return jsonify(response), status
+        
         # Check if user exists in Instacart data
         ml_engine = current_app.ml_engine
         if instacart_user_id not in ml_engine.csv_data_history:
@@ -34,8 +55,6 @@ def seed_demo_user(instacart_user_id):
                 'userId': instacart_user_id
             }), 200
         
-        instacart_user_id_int = int(instacart_user_id)
-        
         # Check if user already exists
         existing = execute_query(
             "SELECT instacart_user_id FROM users WHERE instacart_user_id = %s",
@@ -51,8 +70,7 @@ def seed_demo_user(instacart_user_id):
             }), 200
         
         # Generate credentials
-        email = f'demo{instacart_user_id}@timely.com'
-        password = f'demo_{instacart_user_id}'
+        email, password = demo_credentials(instacart_user_id_int)
         hashed_password = bcrypt.hash(password)
         
         # Create user
@@ -87,6 +105,97 @@ def seed_demo_user(instacart_user_id):
         return jsonify({'error': 'Failed to create demo user'}), 500
 
 
+@admin_bp.route('/demo/seed-users', methods=['POST'])
+def seed_demo_users():
+    """
+    Create many demo users with their Instacart history in a background job
+    Body: {"userIds": [...]} or {"count": N} (N random dataset users not created yet),
+    optional "batchSize". Users are seeded SEED_BATCH_SIZE per transaction by
+    SEED_WORKERS parallel workers; credentials follow /demo/seed-user.
+    Poll GET /demo/seed-users/<job_id> (or /api/admin/jobs/<job_id>) for progress.
+    """
+    try:
+        response, status = submit_seed_job(request.get_json() or {})
+        return jsonify(response), status
+        
+    except (TypeError, ValueError):
+        return jsonify({'error': 'userIds, count and batchSize must be integers'}), 400
+    except Exception as e:
+        print(f"Seed users error: {str(e)}")
+        return jsonify({'error': 'Failed to start demo user seeding'}), 500
+
+
+def submit_seed_job(data):
+    """
+    Resolve the users of a seeding request and start its job
+    (shared by /demo/seed-users, /demo/seed-user?async=true and /api/admin/jobs)
+    
+    Returns:
+        (response body, HTTP status)
+    """
+    history_store = current_app.ml_engine.csv_data_history
+    try:
+        batch_size = int(data.get('batchSize', SEED_BATCH_SIZE))
+        requested = [int(user_id) for user_id in data['userIds']] if 'userIds' in data else None
+        count = int(data['count']) if requested is None and 'count' in data else None
+    except (TypeError, ValueError):
+        return {'error': 'userIds, count and batchSize must be integers'}, 400
+    if batch_size < 1:
+        return {'error': 'batchSize must be positive'}, 400
+    
+    existing = {row['instacart_user_id'] for row in execute_query("SELECT instacart_user_id FROM users")}
+    if requested is not None:
+        unknown = [user_id for user_id in requested if user_id not in history_store]
+        skipped_existing = len({user_id for user_id in requested if user_id in existing})
+        user_ids = list(dict.fromkeys(
+            user_id for user_id in requested if user_id in history_store and user_id not in existing
+        ))
+    elif count is not None:
+        if count < 1:
+            return {'error': 'count must be positive'}, 400
+        candidates = [int(user_id) for user_id in history_store if int(user_id) not in existing]
+        unknown = []
+        skipped_existing = 0
+        user_ids = random.sample(candidates, min(count, len(candidates)))
+    else:
+        return {'error': 'Provide userIds or count'}, 400
+    
+    if len(user_ids) > MAX_SEED_USERS:
+        return {'error': f'At most {MAX_SEED_USERS} users per request'}, 400
+    if not user_ids:
+        return {
+            'success': False,
+            'message': 'No new dataset users to seed, they are unknown or already created',
+            'unknownUserIds': [str(user_id) for user_id in unknown]
+        }, 200
+    
+    job = current_app.jobs.submit(
+        'seed-users',
+        lambda job: run_seed_job(job, user_ids, batch_size),
+        params={'users': len(user_ids), 'batchSize': batch_size}
+    )
+    return {
+        'success': True,
+        'jobId': job.id,
+        'users': len(user_ids),
+        'batches': -(-len(user_ids) // batch_size),
+        'skippedExisting': skipped_existing,
+        'unknownUserIds': [str(user_id) for user_id in unknown],
+        'statusUrl': f'/api/admin/jobs/{job.id}'
+    }, 202
+
+
+@admin_bp.route('/demo/seed-users/<string:job_id>', methods=['GET'])
+def get_seed_users_job(job_id):
+    """
+    Progress (users processed / total) and running totals of a bulk seeding job
+    """
+    job = current_app.jobs.get(job_id)
+    if job is None or job.kind != 'seed-users':
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict(), 'success': True})
+
+
 @admin_bp.route('/demo/user-prediction/<string:user_id>', methods=['GET'])
 def get_user_prediction_comparison(user_id):
     """
@@ -110,40 +219,13 @@ def get_user_prediction_comparison(user_id):
                 'userId': str(user_id)
             }), 200
 
-        with get_db_cursor() as cur:
-            # Predicted products
-            predicted_basket = []
+        # Get ground truth
+        ground_truth_ids = list(dict.fromkeys(ml_engine.ground_truth_basket(user_id_int)))
 
-            # Format predicted items
-            for product_id in prediction['items']:
-                cur.execute("""
-                    SELECT p.*, c.name as category_name
-                    FROM products p
-                    JOIN categories c ON p.department_id = c.department_id
-                    WHERE p.instacart_product_id = %s
-                """, [product_id])
-                
-                product = cur.fetchone()
-                if product:
-                    predicted_basket.append(format_product(product))
-            
-            # Get ground truth
-            ground_truth_basket = []
-            future_df = pd.read_csv('/app/data/dataset/instacart_future.csv')
-            user_future = future_df[future_df['user_id'] == user_id_int]
-            
-            if not user_future.empty:
-                for product_id in user_future['product_id'].unique():
-                    cur.execute("""
-                        SELECT p.*, c.name as category_name
-                        FROM products p
-                        JOIN categories c ON p.department_id = c.department_id
-                        WHERE p.instacart_product_id = %s
-                    """, [int(product_id)])
-                    
-                    product = cur.fetchone()
-                    if product:
-                        ground_truth_basket.append(format_product(product))
+        # Predicted and ground truth products from the in-memory catalog, in their original order
+        catalog = current_app.catalog
+        predicted_basket = catalog.hydrate(prediction['items'])
+        ground_truth_basket = catalog.hydrate(ground_truth_ids)
 
         limit_basket_size = min(len(ground_truth_basket),len(predicted_basket))
         predicted_basket = predicted_basket[:limit_basket_size]
@@ -160,105 +242,209 @@ def get_user_prediction_comparison(user_id):
         return jsonify({'error': 'Failed to generate comparison'}), 500
         
 
+
+@admin_bp.route('/catalog/stats', methods=['GET'])
+def get_catalog_stats():
+    """
+    Size and refresh statistics of the in-memory product catalog
+    """
+    return jsonify({
+        'catalog': current_app.catalog.stats(),
+        'success': True
+    })
+
+
+@admin_bp.route('/catalog/refresh', methods=['POST'])
+def refresh_catalog():
+    """
+    Bump the catalog version (every backend process reloads) and reload this process right away
+    """
+    try:
+        catalog = current_app.catalog
+        catalog.bump_version()
+        catalog.load()
+        return jsonify({
+            'catalog': catalog.stats(),
+            'success': True
+        })
+    except Exception as e:
+        print(f"Catalog refresh error: {str(e)}")
+        return jsonify({'error': 'Failed to refresh catalog'}), 500
+
+
 def import_order_history(user_id:int):
     """
-    Import user's order history from Instacart CSV
+    Import user's order history from the Instacart history store
     """
     try:
-        # Load history data
-        history_df = pd.read_csv('/app/data/dataset/instacart_history.csv')
-        user_history = history_df[history_df['user_id'] == user_id] # string comparison or ints?
-        
-        if user_history.empty:
-            return 0, 0
-        
-        orders_created = 0
-        num_of_items = 0
-        current_date = datetime.now()
-        
         with get_db_cursor() as cur:
-            # Group by order number
-            for order_num, order_data in user_history.groupby('order_number'):
-                # Calculate order date
-                days_offset = int(order_data['days_since_prior_order'].iloc[0]) if 'days_since_prior_order' in order_data else 7
-                order_date = current_date - timedelta(days=int(order_num * 7 + days_offset))
-                
-                # Create order
-                order_id = str(uuid.uuid4())
-                order_total = 0.0
-                
-                cur.execute("""
-                    INSERT INTO orders (
-                        id, user_id, order_number, status, total,
-                        order_sequence, days_since_prior_order,
-                        order_dow, order_hour_of_day, created_at
-                    ) VALUES (%s, %s, %s, 'completed', 0, %s, %s, %s, %s, %s)
-                """, [
-                    order_id, user_id, f'ORD-{user_id}-{order_num}',
-                    int(order_num), float(days_offset),
-                    order_data['order_dow'].iloc[0] if 'order_dow' in order_data else 0,
-                    order_data['order_hour_of_day'].iloc[0] if 'order_hour_of_day' in order_data else 10,
-                    order_date
-                ])
-                
-                # Add order items
-                for _, item in order_data.iterrows():
-                    # Get product price
-                    cur.execute(
-                        "SELECT price FROM products WHERE instacart_product_id = %s",
-                        [int(item['product_id'])]
-                    )
-                    price_row = cur.fetchone()
-                    
-                    if price_row:
-                        price = float(price_row['price'])
-                        quantity = 1
-                        item_total = price * quantity
-                        order_total += item_total
-                        
-                        cur.execute("""
-                            INSERT INTO order_items (
-                                id, order_id, product_id, quantity, price, total,
-                                add_to_cart_order, reordered
-                            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        """, [
-                            str(uuid.uuid4()), order_id, int(item['product_id']),
-                            quantity, price, item_total,
-                            item.get('add_to_cart_order', 1),
-                            bool(item.get('reordered', 0))
-                        ])
-                        num_of_items += 1
-                
-                # Update order total
-                cur.execute(
-                    "UPDATE orders SET total = %s WHERE id = %s",
-                    [order_total, order_id]
-                )
-                
-                orders_created += 1
-        
-        return orders_created, num_of_items
+            orders_created, items_created = import_order_histories(cur, [user_id])
+        return orders_created.get(user_id, 0), items_created.get(user_id, 0)
         
     except Exception as e:
         print(f"Import history error: {str(e)}")
         return 0, 0
 
 
-def format_product(product):
-    """Format product for response"""
-    return {
-        'id': str(product['instacart_product_id']),
-        'sku': f"SKU-{product['instacart_product_id']}",
-        'name': product['name'],
-        'description': product['description'],
-        'price': float(product['price']),
-        'brand': product['brand'],
-        'imageUrl': product['image_url'],
-        'category': {
-            'id': str(product['department_id']),
-            'name': product['category_name']
-        },
-        'stock': 100,
-        'isActive': product['is_active'],
-        'metadata': {}
+def import_order_histories(cur, user_ids):
+    """
+    Bulk import of several users' order histories on one cursor (one transaction)
+    Baskets are read from the engine's memory-mapped history store (indexed by user id)
+    instead of re-reading instacart_history.csv, prices come from one query, and orders
+    (with their totals) and items are written with one multi-row INSERT each.
+    
+    Returns:
+        ({user_id: orders created}, {user_id: items created})
+    """
+    history_store = current_app.ml_engine.csv_data_history
+    histories = {user_id: history_store.baskets(user_id) for user_id in user_ids}
+    
+    # Prices of every product of every basket in one query
+    product_ids = {product_id for baskets in histories.values() for basket in baskets for product_id in basket}
+    cur.execute(
+        "SELECT instacart_product_id, price FROM products WHERE instacart_product_id = ANY(%s)",
+        [list(product_ids)]
+    )
+    prices = {row['instacart_product_id']: row['price'] for row in cur.fetchall()}
+    
+    current_date = datetime.now()
+    order_rows = []
+    item_rows = []
+    orders_created = {}
+    items_created = {}
+    for user_id, baskets in histories.items():
+        ordered_before = set()
+        for basket_index, basket in enumerate(baskets):
+            # Calculate order date (history CSV carries no days_since_prior_order, 7 days apart)
+            order_num = basket_index + 1
+            days_offset = 7
+            order_date = current_date - timedelta(days=int(order_num * 7 + days_offset))
+            order_id = str(uuid.uuid4())
+            
+            # Items keep their add to cart order; reordered = bought in an earlier basket
+            order_total = 0
+            for position, product_id in enumerate(basket):
+                if product_id in prices:
+                    price = prices[product_id]
+                    order_total += price
+                    item_rows.append((
+                        order_id, product_id, 1, price, price,
+                        position + 1, product_id in ordered_before
+                    ))
+                    items_created[user_id] = items_created.get(user_id, 0) + 1
+            ordered_before.update(basket)
+            
+            order_rows.append((
+                order_id, user_id, f'ORD-{user_id}-{order_num}', 'completed', order_total,
+                order_num, float(days_offset), 0, 10, order_date
+            ))
+            orders_created[user_id] = orders_created.get(user_id, 0) + 1
+    
+    if order_rows:
+        execute_values(cur, """
+            INSERT INTO orders (
+                id, user_id, order_number, status, total,
+                order_sequence, days_since_prior_order,
+                order_dow, order_hour_of_day, created_at
+            ) VALUES %s
+        """, order_rows, page_size=1000)
+    if item_rows:
+        execute_values(cur, """
+            INSERT INTO order_items (
+                order_id, product_id, quantity, price, total,
+                add_to_cart_order, reordered
+            ) VALUES %s
+        """, item_rows, page_size=5000)
+    
+    return orders_created, items_created
+
+
+def demo_credentials(user_id: int):
+    """(email, password) of a seeded demo user"""
+    return f'demo{user_id}@timely.com', f'demo_{user_id}'
+
+
+def seed_demo_user_batch(user_ids):
+    """
+    Create a batch of demo users and import their histories in one transaction
+    on a dedicated connection (worker threads do not share the request pool).
+    Users created meanwhile by someone else are skipped by ON CONFLICT.
+    
+    Returns:
+        (users created, orders imported, items imported)
+    """
+    user_rows = []
+    for user_id in user_ids:
+        email, password = demo_credentials(user_id)
+        user_rows.append((user_id, email, bcrypt.hash(password), 'Demo', f'User {user_id}'))
+    
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            created = execute_values(cur, """
+                INSERT INTO users (
+                    instacart_user_id, email, password, first_name, last_name,
+                    role, is_active, email_verified, is_demo_user
+                ) VALUES %s
+                ON CONFLICT DO NOTHING
+                RETURNING instacart_user_id
+            """, user_rows, template="(%s, %s, %s, %s, %s, 'customer', true, true, true)",
+                page_size=len(user_rows), fetch=True)
+            created_ids = [row['instacart_user_id'] for row in created]
+            orders_created, items_created = import_order_histories(cur, created_ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return len(created_ids), sum(orders_created.values()), sum(items_created.values())
+
+
+def run_seed_job(job, user_ids, batch_size: int = SEED_BATCH_SIZE):
+    """
+    Seed user_ids batch by batch over SEED_WORKERS threads, a failed batch is rolled
+    back alone and reported. Running totals are visible in job.result while it runs.
+    Once the job is cancelled, batches that have not started are skipped.
+    """
+    app = current_app._get_current_object()
+    batches = [user_ids[start:start + batch_size] for start in range(0, len(user_ids), batch_size)]
+    job.set_total(len(user_ids))
+    summary = job.result = {
+        'usersCreated': 0,
+        'ordersImported': 0,
+        'itemsImported': 0,
+        'batches': len(batches),
+        'failedBatches': 0,
+        'skippedBatches': 0,
+        'errors': []
     }
+    
+    def seed_batch(batch):
+        if job.cancelled():  # batches not started yet are skipped
+            return None
+        with app.app_context():
+            return seed_demo_user_batch(batch)
+    
+    with ThreadPoolExecutor(max_workers=max(1, SEED_WORKERS)) as pool:
+        futures = {pool.submit(seed_batch, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                seeded = future.result()
+                if seeded is None:
+                    summary['skippedBatches'] += 1
+                    continue
+                users_created, orders_imported, items_imported = seeded
+                summary['usersCreated'] += users_created
+                summary['ordersImported'] += orders_imported
+                summary['itemsImported'] += items_imported
+            except Exception as e:
+                print(f"Seed batch error ({batch[0]}..{batch[-1]}): {str(e)}")
+                summary['failedBatches'] += 1
+                summary['errors'].append(f'Users {batch[0]}..{batch[-1]}: {str(e)}')
+            job.advance(len(batch))
+    
+    print(f"🌱 Seeded {summary['usersCreated']} demo users, {summary['ordersImported']} orders, "
+          f"{summary['itemsImported']} items ({summary['failedBatches']} failed batches)")
+    return summary
@@ -0,0 +1,139 @@
+# backend/endpoints/engine.py
+"""
+ML engine administration: served TIFUKNN parameters and vector generations
+New query-time parameters are swapped in at once, new vector parameters are
+built by a background 'precompute-vectors' job and swapped in when warmed,
+vectors replaced on disk are hot reloaded by a 'reload-vectors' job
+"""
+
+import threading
+from flask import Blueprint, request, jsonify, current_app
+from database import get_db_cursor
+from predicted_baskets import deactivate_all_baskets
+
+engine_bp = Blueprint('engine', __name__)
+
+_precompute_submit_lock = threading.Lock()  # Makes the single-flight check and the submit one step
+
+
+@engine_bp.route('/params', methods=['GET'])
+def get_engine_params():
+    """
+    Served generation, pending parameters and generation being warmed
+    """
+    engine = current_app.ml_engine
+    warming = engine.warming
+    return jsonify({
+        'generation': engine.generation.to_dict(),
+        'pendingParams': engine.pending_params.to_dict() if engine.pending_params else None,
+        'warming': warming.to_dict() if warming else None,
+        'lastReload': engine.last_reload,
+        'success': True
+    })
+
+
+@engine_bp.route('/params', methods=['PUT'])
+def update_engine_params():
+    """
+    Change the served parameters
+    Body: any of {"within_decay", "group_decay", "group_size", "alpha", "k", "topk"},
+    the others keep their pending (else served) value
+        - alpha / k / topk only: swapped in immediately (200)
+        - vector parameters: vectors rebuilt by a background job, swapped in when done (202)
+    """
+    try:
+        data = request.get_json() or {}
+        if not data:
+            return jsonify({'error': 'No parameters given'}), 400
+
+        engine = current_app.ml_engine
+        try:
+            params = (engine.pending_params or engine.params).update(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if engine.reconfigure(params):
+            return jsonify({
+                'success': True,
+                'generation': engine.generation.to_dict()
+            })
+
+        job = submit_precompute_job(params=params)
+        return jsonify({
+            'success': True,
+            'pendingParams': params.to_dict(),
+            'jobId': job.id,
+            'statusUrl': f'/api/admin/jobs/{job.id}'
+        }), 202
+
+    except Exception as e:
+        print(f"Engine params error: {str(e)}")
+        return jsonify({'error': 'Failed to update engine parameters'}), 500
+
+
+@engine_bp.route('/reload', methods=['POST'])
+def reload_vectors():
+    """
+    Hot reload the recommender vectors from disk in the background and swap them in
+    (e.g. after an offline precompute), without restarting the backend
+    Body (optional): {"force": true} to reload even when the served store is current
+    """
+    data = request.get_json(silent=True) or {}
+    job = submit_reload_job(bool(data.get('force', False)))
+    return jsonify({
+        'success': True,
+        'jobId': job.id,
+        'statusUrl': f'/api/admin/jobs/{job.id}'
+    }), 202
+
+
+def submit_reload_job(force=False):
+    """Queue a 'reload-vectors' job, its result is the reload report (load time, memory delta)"""
+    return current_app.jobs.submit(
+        'reload-vectors',
+        lambda job: current_app.ml_engine.reload_recommender_vectors(force),
+        params={'force': force},
+        cancellable=False
+    )
+
+
+def submit_precompute_job(workers=None, params=None):
+    """
+    Queue a 'precompute-vectors' job building params (default: pending, else served ones)
+    Single flight: a queued or running job for the same parameters is returned instead
+    of a second one, and the engine runs one build at a time anyway
+    """
+    job_params = {'workers': workers, 'params': params.to_dict() if params else None}
+    with _precompute_submit_lock:
+        for status in ('queued', 'running'):
+            for job in current_app.jobs.list(kind='precompute-vectors', status=status):
+                if job.params['params'] == job_params['params']:
+                    return job
+        return current_app.jobs.submit(
+            'precompute-vectors',
+            lambda job: run_precompute_job(job, workers, params),
+            params=job_params,
+            cancellable=False
+        )
+
+
+def run_precompute_job(job, workers=None, params=None):
+    """
+    Recompute and persist the recommender vectors as a new generation and swap it in
+    """
+    return current_app.ml_engine.precompute_recommender_vectors(workers, progress=job.set_progress, params=params)
+
+
+def retire_predictions() -> int:
+    """
+    Forget predictions of the previous generation: the in-process response cache
+    and the stored baskets (returns how many were deactivated).
+    Registered in app.py as a listener of every generation swap
+    """
+    current_app.prediction_cache.clear()
+    try:
+        with get_db_cursor() as cur:
+            return deactivate_all_baskets(cur)
+    except Exception as e:
+        print(f"Error retiring stored baskets: {str(e)}")
+        return 0
@@ -5,13 +5,9 @@ Implements Demand #2 - Model Performance Stats
 All calculations are self-contained for simplicity
 """
 
-from flask import Blueprint, jsonify, current_app
-import pandas as pd
+from flask import Blueprint, jsonify, current_app, request
 import os
-import numpy as np
-import math
-import random
-from typing import List, Set
+from ml_engine.evaluation import evaluate
 
 evaluations_bp = Blueprint('evaluations', __name__)
 
@@ -28,6 +24,10 @@ def evaluate_metrics(sample_size):
     - F1ScoreAt: Harmonic mean of precision and recall
     - NDCGAt: Ranking quality (higher ranked hits are better)
     - JaccardSimilarity: Set overlap between predicted and actual
+    - timings: seconds spent per phase (selectUsers, predict, groundTruth, metrics, total)
+    
+    With ?async=true the evaluation runs as a background job and the job id is
+    returned right away, poll GET /api/admin/jobs/<job_id> for progress and metrics.
     """
     try:
         # Convert sample_size to integer and validate
@@ -40,122 +40,28 @@ def evaluate_metrics(sample_size):
         if sample_size < 1 and sample_size != -1:
             return jsonify({'error': 'Sample size must be at least 1 or -1 for all users'}), 400
         
-        # Get ML engine and data
+        # Get ML engine
         ml_engine = current_app.ml_engine
         
-        # Load ground truth data
-        future_df = pd.read_csv('/app/data/dataset/instacart_future.csv')
-        
-        # Get test and validation users
-        test_users = [str(uid) for uid in ml_engine.keyset.get('test', [])]
-        val_users = [str(uid) for uid in ml_engine.keyset.get('val', [])]
-        
-        # Combine and sample
-        # In this iteration of building the project,
-        # We use both val users and test users for testing 
-        # Predictions results
-        all_eval_users = test_users + val_users
-        
-        # Handle "all users" case
-        if sample_size == -1:
-            sample_size = len(all_eval_users)
-        
-        # Initialize metric accumulators
-        precisions = []
-        recalls = []
-        f1_scores = []
-        ndcg_scores = []
-        jaccard_scores = []
-        valid_users = 0
-        
-        # Evaluate each user
-        while valid_users < sample_size and len(all_eval_users) > 0:
-            random_index = random.randrange(len(all_eval_users))
-            random_eval_user_id = all_eval_users.pop(random_index)       
+        # Long evaluations (e.g. -1 = all val/test users) run as a background job
+        if request.args.get('async', 'false').lower() == 'true':
+            job = submit_evaluation_job(sample_size)
+            return jsonify({
+                'success': True,
+                'jobId': job.id,
+                'statusUrl': f'/api/admin/jobs/{job.id}'
+            }), 202
         
-            # Get prediction from ML engine
-            result = ml_engine.predict_basket(random_eval_user_id, use_csv_data=True)
-            if not result['success']:
-                continue
-            predicted_items = result['items']
-            
-            # Get ground truth
-            user_future = future_df[future_df['user_id'] == int(random_eval_user_id)]
-            true_items = user_future['product_id'].tolist()
-            if not true_items:
-                continue
-
-            valid_users += 1
-
-            # basket_limit_size param:
-            # For simplicity now, override the EVALUATE_AT env var.
-            # This softens the requirements a bit but it is OK.
-            basket_limit_size = min(len(true_items), len(predicted_items))
-            predicted_items_set = set(predicted_items[:basket_limit_size])
-            true_items_set = set(true_items[:basket_limit_size])         
-            
-            # Calculate Precision@
-            # Precision = |predicted ∩ actual| / |predicted|
-            if predicted_items_set:
-                precision = len(predicted_items_set & true_items_set) / len(predicted_items_set)
-                precisions.append(precision)
-            else:
-                precisions.append(0.0)
-            
-            # Calculate Recall@
-            # Recall = |predicted ∩ actual| / |actual|
-            recall = len(predicted_items_set & true_items_set) / len(true_items_set)
-            recalls.append(recall)
-            
-            # Calculate F1-Score
-            # F1 = 2 * (precision * recall) / (precision + recall)
-            if precisions[-1] + recalls[-1] > 0:
-                f1 = 2 * (precisions[-1] * recalls[-1]) / (precisions[-1] + recalls[-1])
-            else:
-                f1 = 0.0
-            f1_scores.append(f1)
-            
-            # Calculate NDCG
-            # NDCG = DCG / IDCG
-            dcg = 0.0
-            for i, item in enumerate(predicted_items):
-                if item in true_items_set:
-                    # Relevance is 1 if item was purchased, 0 otherwise
-                    dcg += 1.0 / math.log2(i + 2)  # i+2 because position starts at 0
-            
-            # Ideal DCG: all relevant items at top positions
-            idcg = sum(1.0 / math.log2(i + 2) for i in range(min(len(true_items), basket_limit_size)))
-            
-            ndcg = dcg / idcg if idcg > 0 else 0.0
-            ndcg_scores.append(ndcg)
-            
-            # Calculate Jaccard Similarity
-            # Jaccard = |predicted ∩ actual| / |predicted ∪ actual|
-            if predicted_items_set or true_items_set:
-                intersection = len(predicted_items_set & true_items_set)
-                union = len(predicted_items_set | true_items_set)
-                jaccard = intersection / union if union > 0 else 0.0
-            else:
-                jaccard = 1.0  # Both empty sets
-            jaccard_scores.append(jaccard)
+        # Batched predictions over a worker pool, metrics computed over padded top-K matrices
+        metrics = evaluate(ml_engine, sample_size)
         
         # Check if we have valid results
-        if valid_users == 0:
+        if metrics['sampleSize'] == 0:
             return jsonify({
                 'error': 'No valid users found for evaluation',
                 'sampleSize': 0
             }), 400
         
-        # Calculate final averaged metrics
-        metrics = {
-            'PrecisionAt': round(np.mean(precisions), 4),
-            'RecallAt': round(np.mean(recalls), 4),
-            'F1ScoreAt': round(np.mean(f1_scores), 4),
-            'NDCGAt': round(np.mean(ndcg_scores), 4),
-            'JaccardSimilarity': round(np.mean(jaccard_scores), 4),
-            'sampleSize': valid_users
-        }
-        
         return jsonify(metrics)
         
     except Exception as e:
@@ -167,4 +73,36 @@ def evaluate_metrics(sample_size):
         return jsonify({
             'success': False,
             'error': f'Evaluation failed: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@evaluations_bp.route('/metrics/jobs/<string:job_id>', methods=['GET'])
+def get_evaluation_job(job_id):
+    """
+    Progress (users predicted / sample size) and, once completed, metrics of an async evaluation
+    """
+    job = current_app.jobs.get(job_id)
+    if job is None or job.kind != 'evaluation':
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict(), 'success': True})
+
+
+def submit_evaluation_job(sample_size: int):
+    """Start an async evaluation (shared with POST /api/admin/jobs)"""
+    ml_engine = current_app.ml_engine
+    return current_app.jobs.submit(
+        'evaluation',
+        lambda job: run_evaluation_job(job, ml_engine, sample_size),
+        params={'sampleSize': sample_size}
+    )
+
+
+def run_evaluation_job(job, ml_engine, sample_size: int):
+    """
+    Background job runner of an async evaluation, the metrics become the job result
+    A cancelled evaluation stops after the current batch and scores the users predicted so far
+    """
+    metrics = evaluate(ml_engine, sample_size, progress=job.set_progress, cancelled=job.cancelled)
+    if metrics['sampleSize'] == 0 and not job.cancelled():
+        raise ValueError('No valid users found for evaluation')
+    return metrics
@@ -3,7 +3,7 @@
 Favorites management endpoints
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from database import execute_query, execute_delete
 import uuid
 
@@ -25,36 +25,23 @@ def get_favorites(user_id):
             return jsonify({'error': 'Invalid user ID'}), 400
 
         favorites = execute_query("""
-            SELECT f.id as favorite_id, f.user_id, f.product_id, 
-                   p.instacart_product_id, p.name, p.description, p.price, p.brand, p.image_url, p.is_active, p.department_id,
-                   c.name as category_name, c.image_url as category_image
+            SELECT f.id as favorite_id, f.user_id, f.product_id
             FROM favorites f
-            JOIN products p ON f.product_id = p.instacart_product_id
-            JOIN categories c ON p.department_id = c.department_id
             WHERE f.user_id = %s
         """, [user_id_int])
 
+        # Product details of all favorites from the in-memory catalog at once
+        products = {product['id']: product
+                    for product in current_app.catalog.hydrate([fav['product_id'] for fav in favorites])}
         formatted_favorites = []
         for fav in favorites:
+            product = products.get(str(fav['product_id']))
+            if not product:
+                continue
             favorite_item = {
                 'id': fav['favorite_id'],
                 'userId': str(user_id_int),
-                'product': {
-                    'id': str(fav['product_id']),
-                    'sku': f"SKU-{fav['product_id']}",
-                    'name': fav['name'],
-                    'description': fav['description'],
-                    'price': float(fav['price']),
-                    'brand': fav['brand'],
-                    'imageUrl': fav['image_url'] or fav['category_image'],
-                    'category': {
-                        'id': str(fav['department_id']),
-                        'name': fav['category_name']
-                    },
-                    'stock': 100,
-                    'isActive': fav['is_active'],
-                    'metadata': {}
-                }
+                'product': product
             }
             formatted_favorites.append(favorite_item)
 
@@ -96,13 +83,7 @@ def add_favorite(user_id):
             return jsonify({'error': 'User not found'}), 404
 
         # Check if product exists
-        product_exists = execute_query(
-            "SELECT instacart_product_id FROM products WHERE instacart_product_id = %s",
-            [product_id],
-            fetch_one=True
-        )
-
-        if not product_exists:
+        if not current_app.catalog.product(product_id):
             return jsonify({'error': 'Product not found'}), 404
 
         # Check if already favorited
@@ -0,0 +1,101 @@
+# backend/endpoints/jobs.py
+"""
+Background job endpoints: submit, poll, list and cancel long admin operations
+(evaluation, bulk demo seeding, recommender vector pre-computation and hot reload,
+predicted basket pre-computation)
+"""
+
+from flask import Blueprint, request, jsonify, current_app
+from endpoints.admin import submit_seed_job
+from endpoints.evaluations import submit_evaluation_job
+from endpoints.engine import submit_precompute_job, submit_reload_job
+from endpoints.predictions import submit_basket_precompute_job
+
+jobs_bp = Blueprint('jobs', __name__)
+
+JOB_KINDS = ('evaluation', 'seed-users', 'precompute-vectors', 'reload-vectors', 'precompute-baskets')
+
+
+@jobs_bp.route('', methods=['POST'])
+def submit_job():
+    """
+    Start a background job
+    Body: {"kind": "<JOB_KINDS>", "params": {...}}
+        - evaluation: {"sampleSize": N or -1}
+        - seed-users: {"userIds": [...]} or {"count": N}, optional "batchSize"
+        - precompute-vectors: optional {"workers": N}
+        - reload-vectors: optional {"force": true}
+        - precompute-baskets: no parameters
+    """
+    try:
+        data = request.get_json() or {}
+        kind = data.get('kind')
+        params = data.get('params') or {}
+
+        if kind == 'evaluation':
+            sample_size = int(params.get('sampleSize', -1))
+            if sample_size < 1 and sample_size != -1:
+                return jsonify({'error': 'sampleSize must be at least 1 or -1 for all users'}), 400
+            job = submit_evaluation_job(sample_size)
+        elif kind == 'seed-users':
+            response, status = submit_seed_job(params)
+            return jsonify(response), status
+        elif kind == 'precompute-vectors':
+            workers = int(params['workers']) if params.get('workers') else None
+            job = submit_precompute_job(workers)
+        elif kind == 'reload-vectors':
+            job = submit_reload_job(bool(params.get('force', False)))
+        elif kind == 'precompute-baskets':
+            job = submit_basket_precompute_job()
+        else:
+            return jsonify({'error': f'kind must be one of {", ".join(JOB_KINDS)}'}), 400
+
+        return jsonify({
+            'success': True,
+            'jobId': job.id,
+            'statusUrl': f'/api/admin/jobs/{job.id}'
+        }), 202
+
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Job parameters must be integers'}), 400
+    except Exception as e:
+        print(f"Job submit error: {str(e)}")
+        return jsonify({'error': 'Failed to start job'}), 500
+
+
+@jobs_bp.route('', methods=['GET'])
+def list_jobs():
+    """
+    Jobs of this backend process, newest first, optionally filtered by ?kind= and ?status=
+    """
+    jobs = current_app.jobs.list(kind=request.args.get('kind'), status=request.args.get('status'))
+    return jsonify({
+        'jobs': [job.to_dict() for job in jobs],
+        'total': len(jobs),
+        'success': True
+    })
+
+
+@jobs_bp.route('/<string:job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Status, progress and (partial) result of a job
+    """
+    job = current_app.jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict(), 'success': True})
+
+
+@jobs_bp.route('/<string:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    Cancel a queued job, or ask a running one to stop at its next checkpoint
+    """
+    try:
+        job = current_app.jobs.cancel(job_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job': job.to_dict(), 'success': True})
@@ -3,8 +3,10 @@
 Order management endpoints
 """
 
-from flask import Blueprint, request, jsonify
-from database import execute_query, execute_insert
+from flask import Blueprint, request, jsonify, current_app
+from database import execute_query, get_db_cursor
+from predicted_baskets import deactivate_baskets
+from pagination import encode_cursor, decode_cursor
 import uuid
 import math
 
@@ -45,13 +47,8 @@ def create_order(user_id):
                 price = float(item['price'])
                 item_total = price * quantity
                 
-                # Validate product exists in database
-                product = execute_query("""
-                    SELECT p.*, c.name as category_name
-                    FROM products p
-                    JOIN categories c ON p.department_id = c.department_id
-                    WHERE p.instacart_product_id = %s
-                """, [product_id], fetch_one=True)
+                # Validate product exists in the catalog
+                product = current_app.catalog.product(product_id)
                 
                 if not product:
                     return jsonify({'error': f'Product {product_id} not found'}), 400
@@ -72,22 +69,7 @@ def create_order(user_id):
                 formatted_items.append({
                     'id': str(uuid.uuid4()),
                     'orderId': order_id,
-                    'product': {
-                        'id': str(product['instacart_product_id']),
-                        'sku': f"SKU-{product['instacart_product_id']}",
-                        'name': product['name'],
-                        'description': product['description'],
-                        'price': float(product['price']),
-                        'brand': product['brand'],
-                        'imageUrl': product['image_url'],
-                        'category': {
-                            'id': str(product['department_id']),
-                            'name': product['category_name']
-                        },
-                        'stock': 100,
-                        'isActive': True,
-                        'metadata': {}
-                    },
+                    'product': product,
                     'quantity': quantity,
                     'price': price,
                     'total': item_total,
@@ -98,25 +80,30 @@ def create_order(user_id):
             except Exception as item_error:
                 return jsonify({'error': f'Error processing item {i}: {str(item_error)}'}), 400
 
-        # Save order to database
+        # Save the order and its items in one transaction, so no reader (e.g. a vector
+        # state rebuild) ever sees the order without its items
         try:
-            execute_insert("""
-                INSERT INTO orders (id, user_id, order_number, status, total, payment_method, payment_status)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, [order_id, user_id_int, order_number, 'confirmed', total, payment_method, 'paid'], returning=False)
+            with get_db_cursor() as cur:
+                cur.execute("""
+                    INSERT INTO orders (id, user_id, order_number, status, total, payment_method, payment_status)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, [order_id, user_id_int, order_number, 'confirmed', total, payment_method, 'paid'])
+                for item_data in order_items_data:
+                    cur.execute("""
+                        INSERT INTO order_items (order_id, product_id, quantity, price, total, add_to_cart_order)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                    """, [order_id, item_data['product_id'], item_data['quantity'],
+                          item_data['price'], item_data['total'], item_data['add_to_cart_order']])
         except Exception as order_error:
             return jsonify({'error': f'Failed to create order: {str(order_error)}'}), 500
 
-        # Save order items to database
-        for i, item_data in enumerate(order_items_data):
-            try:
-                execute_insert("""
-                    INSERT INTO order_items (order_id, product_id, quantity, price, total, add_to_cart_order)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, [order_id, item_data['product_id'], item_data['quantity'], 
-                      item_data['price'], item_data['total'], item_data['add_to_cart_order']], returning=False)
-            except Exception as item_error:
-                return jsonify({'error': f'Failed to create order item {i}: {str(item_error)}'}), 500
+        # Fold the new basket into the user's vector state, instead of recomputing the history on the next prediction
+        current_app.ml_engine.update_user_vector_state(user_id_int, [item_data['product_id'] for item_data in order_items_data])
+
+        # The new order changes the user's history, drop the cached and the stored prediction
+        current_app.prediction_cache.invalidate(user_id)
+        with get_db_cursor() as cur:
+            deactivate_baskets(cur, user_id_int)
 
         # Return complete order data
         return jsonify({
@@ -138,7 +125,11 @@ def create_order(user_id):
 
 @orders_bp.route('/user/<string:user_id>', methods=['GET'])
 def get_user_orders(user_id):
-    """Get user's orders"""
+    """
+    Get user's orders
+    Page/offset mode by default; passing `after` (empty for the first page)
+    switches to keyset pagination over (created_at, id) with an opaque `nextCursor`
+    """
     try:
         # Convert string ID to int for database query
         try:
@@ -151,6 +142,16 @@ def get_user_orders(user_id):
         limit = int(request.args.get('limit', 10))
         offset = (page - 1) * limit
         
+        # Keyset mode
+        keyset = 'after' in request.args
+        include_total = not keyset or request.args.get('includeTotal', 'false').lower() == 'true'
+        try:
+            position = decode_cursor(request.args.get('after', '')) if keyset else {}
+            if position and ('createdAt' not in position or 'id' not in position):
+                raise ValueError('Cursor does not belong to order history')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
         # Status filtering
         status = request.args.get('status')
         
@@ -162,67 +163,55 @@ def get_user_orders(user_id):
             where_clause += " AND status = %s"
             query_params.append(status)
 
-        # Get total order count for the user (with status filter)
-        total_orders_query = execute_query(
-            f"SELECT COUNT(*) as count FROM orders {where_clause}",
-            query_params,
-            fetch_one=True
-        )
-        total_orders = total_orders_query['count'] if total_orders_query else 0
+        # Get total order count for the user (with status filter), optional for keyset pages
+        total_orders = None
+        if include_total:
+            total_orders_query = execute_query(
+                f"SELECT COUNT(*) as count FROM orders {where_clause}",
+                query_params,
+                fetch_one=True
+            )
+            total_orders = total_orders_query['count'] if total_orders_query else 0
 
-        orders = execute_query(f"""
-            SELECT * FROM orders
-            {where_clause}
-            ORDER BY created_at DESC
-            LIMIT %s OFFSET %s
-        """, query_params + [limit, offset])
+        if keyset:
+            # Orders strictly older than the last (created_at, id) of the previous page,
+            # one extra row tells whether another page follows
+            page_clause = where_clause
+            page_params = list(query_params)
+            if position and position['createdAt'] is None:
+                # Rows without created_at sort first (NULLS FIRST in DESC order)
+                page_clause += " AND (created_at IS NOT NULL OR id < %s::uuid)"
+                page_params.append(position['id'])
+            elif position:
+                page_clause += " AND (created_at, id) < (%s::timestamp, %s::uuid)"
+                page_params.extend([position['createdAt'], position['id']])
+            orders = execute_query(f"""
+                SELECT * FROM orders
+                {page_clause}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            """, page_params + [limit + 1])
+            has_more = len(orders) > limit
+            orders = orders[:limit]
+        else:
+            orders = execute_query(f"""
+                SELECT * FROM orders
+                {where_clause}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s OFFSET %s
+            """, query_params + [limit, offset])
+
+        # Items of every order on the page in one query
+        order_items = load_order_items([order['id'] for order in orders])
 
         formatted_orders = []
         for order in orders:
-            # Get order items
-            items = execute_query("""
-                SELECT oi.*, p.name, p.description, p.brand, p.image_url,
-                       c.department_id, c.name as category_name
-                FROM order_items oi
-                JOIN products p ON oi.product_id = p.instacart_product_id
-                JOIN categories c ON p.department_id = c.department_id
-                WHERE oi.order_id = %s
-            """, [order['id']])
-
-            formatted_items = []
-            for item in items:
-                formatted_items.append({
-                    'id': item['id'],
-                    'orderId': item['order_id'],
-                    'product': {
-                        'id': str(item['product_id']),
-                        'sku': f"SKU-{item['product_id']}",
-                        'name': item['name'],
-                        'description': item['description'],
-                        'price': float(item['price']),
-                        'brand': item['brand'],
-                        'imageUrl': item['image_url'],
-                        'category': {
-                            'id': str(item['department_id']),
-                            'name': item['category_name']
-                        },
-                        'stock': 100,
-                        'isActive': True,
-                        'metadata': {}
-                    },
-                    'quantity': item['quantity'],
-                    'price': float(item['price']),
-                    'total': float(item['total']),
-                    'addToCartOrder': item['add_to_cart_order'],
-                    'reordered': item['reordered']
-                })
-
             formatted_orders.append({
                 'id': order['id'],
                 'orderNumber': order['order_number'],
                 'userId': str(order['user_id']),
                 'status': order['status'],
-                'items': formatted_items,
+                'items': order_items.get(order['id'], []),
                 'total': float(order['total']),
                 'paymentMethod': order['payment_method'] or 'card',
                 'paymentStatus': order['payment_status'] or 'paid',
@@ -235,6 +224,19 @@ def get_user_orders(user_id):
                 'updatedAt': order['updated_at'].isoformat() if order['updated_at'] else None
             })
 
+        if keyset:
+            response = {
+                'orders': formatted_orders,
+                'nextCursor': encode_cursor({
+                    'createdAt': orders[-1]['created_at'].isoformat() if orders[-1]['created_at'] else None,
+                    'id': str(orders[-1]['id'])
+                }) if has_more and orders else None,
+                'hasMore': has_more
+            }
+            if include_total:
+                response['total'] = total_orders
+            return jsonify(response)
+
         return jsonify({
             'orders': formatted_orders,
             'total': total_orders,
@@ -262,42 +264,7 @@ def get_order(order_id):
             return jsonify({'error': 'Order not found'}), 404
 
         # Get order items
-        items = execute_query("""
-            SELECT oi.*, p.name, p.description, p.brand, p.image_url,
-                    c.department_id, c.name as category_name
-            FROM order_items oi
-            JOIN products p ON oi.product_id = p.instacart_product_id
-            JOIN categories c ON p.department_id = c.department_id
-            WHERE oi.order_id = %s
-        """, [order['id']])
-
-        formatted_items = []
-        for item in items:
-            formatted_items.append({
-                'id': item['id'],
-                'orderId': item['order_id'],
-                'product': {
-                    'id': str(item['product_id']),
-                    'sku': f"SKU-{item['product_id']}",
-                    'name': item['name'],
-                    'description': item['description'],
-                    'price': float(item['price']),
-                    'brand': item['brand'],
-                    'imageUrl': item['image_url'],
-                    'category': {
-                        'id': str(item['department_id']),
-                        'name': item['category_name']
-                    },
-                    'stock': 100,
-                    'isActive': True,
-                    'metadata': {}
-                },
-                'quantity': item['quantity'],
-                'price': float(item['price']),
-                'total': float(item['total']),
-                'addToCartOrder': item['add_to_cart_order'],
-                'reordered': item['reordered']
-            })
+        formatted_items = load_order_items([order['id']]).get(order['id'], [])
 
         return jsonify({
             'id': order['id'],
@@ -314,4 +281,52 @@ def get_order(order_id):
 
     except Exception as e:
         print(f"Get order error: {str(e)}")
-        return jsonify({'error': 'Failed to fetch order'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to fetch order'}), 500
+
+
+def load_order_items(order_ids):
+    """
+    Formatted items of several orders with one query, grouped by order id
+    (items in add-to-cart order, orders without items are left out)
+    """
+    if not order_ids:
+        return {}
+
+    items = execute_query("""
+        SELECT oi.*, p.name, p.description, p.brand, p.image_url,
+               c.department_id, c.name as category_name
+        FROM order_items oi
+        JOIN products p ON oi.product_id = p.instacart_product_id
+        JOIN categories c ON p.department_id = c.department_id
+        WHERE oi.order_id = ANY(%s::uuid[])
+        ORDER BY oi.order_id, oi.add_to_cart_order
+    """, [[str(order_id) for order_id in order_ids]])
+
+    order_items = {}
+    for item in items:
+        order_items.setdefault(item['order_id'], []).append({
+            'id': item['id'],
+            'orderId': item['order_id'],
+            'product': {
+                'id': str(item['product_id']),
+                'sku': f"SKU-{item['product_id']}",
+                'name': item['name'],
+                'description': item['description'],
+                'price': float(item['price']),
+                'brand': item['brand'],
+                'imageUrl': item['image_url'],
+                'category': {
+                    'id': str(item['department_id']),
+                    'name': item['category_name']
+                },
+                'stock': 100,
+                'isActive': True,
+                'metadata': {}
+            },
+            'quantity': item['quantity'],
+            'price': float(item['price']),
+            'total': float(item['total']),
+            'addToCartOrder': item['add_to_cart_order'],
+            'reordered': item['reordered']
+        })
+    return order_items
@@ -3,14 +3,22 @@
 Prediction endpoints for ML basket recommendations
 """
 
-from flask import Blueprint, jsonify, current_app
+import threading
+from flask import Blueprint, request, jsonify, current_app
 from database import execute_query, get_db_cursor
+from ml_engine import DATABASE_CONFIG
+from predicted_baskets import load_stored_basket, precompute_baskets, store_basket
+import psycopg2
 import uuid
 from datetime import datetime, timedelta
 
 predictions_bp = Blueprint('predictions', __name__)
 
-def format_prediction_response(ml_result):
+MAX_BATCH_PREDICTION_USERS = 1000 # Upper bound of users per /batch request
+
+_basket_submit_lock = threading.Lock()  # Makes the single-flight check and the submit one step
+
+def format_prediction_response(ml_result, basket_id=None):
     """
     Format ML engine result into API response
     """
@@ -21,44 +29,14 @@ def format_prediction_response(ml_result):
             'success': False
         }
     
-    # Get product details for predicted items
-    predicted_items = []
+    # Get product details for predicted items from the in-memory catalog, ranking order kept
+    products = current_app.catalog.hydrate(ml_result['items'])
     
-    with get_db_cursor() as cur:
-        for product_id in ml_result['items']:
-            cur.execute("""
-                SELECT p.*, c.name as category_name, c.image_url as category_image
-                FROM products p
-                JOIN categories c ON p.department_id = c.department_id
-                WHERE p.instacart_product_id = %s
-            """, [product_id])
-            
-            product = cur.fetchone()
-            
-            if product:
-                predicted_items.append({
-                    'product': {
-                        'id': str(product['instacart_product_id']),
-                        'sku': f"SKU-{product['instacart_product_id']}",
-                        'name': product['name'],
-                        'description': product['description'],
-                        'price': float(product['price']),
-                        'brand': product['brand'],
-                        'imageUrl': product['image_url'] or product['category_image'],
-                        'category': {
-                            'id': str(product['department_id']),
-                            'name': product['category_name']
-                        },
-                        'stock': 100,  # Default stock
-                        'isActive': product['is_active'],
-                        'metadata': {}
-                    },
-                    'quantity': 1
-                })
+    predicted_items = [{'product': product, 'quantity': 1} for product in products]
     
     return {
         'basket': {
-            'id': str(uuid.uuid4()),
+            'id': basket_id or str(uuid.uuid4()),
             'items': predicted_items
         },
         'success': True
@@ -77,9 +55,9 @@ def get_predicted_basket(user_id):
         except ValueError:
             return jsonify({'error': 'Invalid user ID'}), 400
         
-        # Check if user exists and has sufficient orders
+        # Check if user exists and has sufficient orders, the same row is the cache fingerprint
         order_count = execute_query(
-            "SELECT COUNT(*) as count FROM orders WHERE user_id = %s",
+            "SELECT COUNT(*) as count, MAX(created_at) as latest_order_at FROM orders WHERE user_id = %s",
             [user_id_int],
             fetch_one=True
         )
@@ -91,12 +69,33 @@ def get_predicted_basket(user_id):
                 'success': False
             })
         
-        # Generate prediction using ML engine
-        ml_engine = current_app.ml_engine
-        prediction = ml_engine.predict_basket(user_id, use_csv_data=False)
+        # Serve the cached prediction while the order history is unchanged
+        prediction_cache = current_app.prediction_cache
+        fingerprint = prediction_cache.fingerprint(order_count['count'], order_count['latest_order_at'])
+        response = prediction_cache.get(user_id, fingerprint)
+        if response is not None:
+            return jsonify(response)
+        
+        # Serve the materialized basket while it is valid, otherwise predict and store a fresh one
+        with get_db_cursor() as cur:
+            stored_basket = load_stored_basket(cur, user_id_int, fingerprint)
+        
+        if stored_basket:
+            basket_id, product_ids = stored_basket
+            prediction = {'success': True, 'items': product_ids}
+        else:
+            # Generate prediction using ML engine
+            ml_engine = current_app.ml_engine
+            prediction = ml_engine.predict_basket(user_id, use_csv_data=False)
+            basket_id = None
+            if prediction['success']:
+                with get_db_cursor() as cur:
+                    basket_id = store_basket(cur, user_id_int, prediction['items'], fingerprint, prediction.get('metadata'))
         
         # Format and return response
-        response = format_prediction_response(prediction)
+        response = format_prediction_response(prediction, basket_id)
+        if response['success']:
+            prediction_cache.put(user_id, fingerprint, response)
         return jsonify(response)
         
     except Exception as e:
@@ -107,3 +106,87 @@ def get_predicted_basket(user_id):
             'success': False
         }), 500
 
+
+
+@predictions_bp.route('/batch', methods=['POST'])
+def get_predictions_batch():
+    """
+    Get predictions for many users in one request (nightly precomputation, evaluation jobs)
+    Body: {"userIds": ["1", "2", ...], "useCsvData": false}
+    """
+    try:
+        data = request.json or {}
+        user_ids = [str(user_id) for user_id in data.get('userIds', [])]
+        use_csv_data = bool(data.get('useCsvData', False))
+        
+        if not user_ids:
+            return jsonify({'error': 'userIds are required'}), 400
+        if len(user_ids) > MAX_BATCH_PREDICTION_USERS:
+            return jsonify({'error': f'At most {MAX_BATCH_PREDICTION_USERS} users per batch'}), 400
+        
+        # One batched engine call for all users
+        ml_engine = current_app.ml_engine
+        predictions = ml_engine.predict_baskets(user_ids, use_csv_data=use_csv_data)
+        
+        formatted_predictions = []
+        for user_id, prediction in predictions.items():
+            formatted = {
+                'userId': user_id,
+                'success': prediction['success'],
+                'productIds': [str(product_id) for product_id in prediction['items']]
+            }
+            if not prediction['success']:
+                formatted['error'] = prediction.get('error', 'Prediction failed')
+            formatted_predictions.append(formatted)
+        
+        return jsonify({
+            'predictions': formatted_predictions,
+            'success': True
+        })
+        
+    except Exception as e:
+        print(f"Batch prediction error: {str(e)}")
+        return jsonify({
+            'predictions': [],
+            'error': 'Failed to generate predictions',
+            'success': False
+        }), 500
+
+
+@predictions_bp.route('/cache/stats', methods=['GET'])
+def get_prediction_cache_stats():
+    """
+    Hit/miss statistics of the per-user prediction cache
+    """
+    return jsonify({
+        'cache': current_app.prediction_cache.stats(),
+        'success': True
+    })
+
+
+def submit_basket_precompute_job():
+    """
+    Queue a 'precompute-baskets' job storing the predicted baskets of every active user
+    (started by app.py once the backend serves). Single flight: a queued or running one is returned.
+    Until a user's basket is stored, /predicted-basket serves and stores the live prediction.
+    """
+    with _basket_submit_lock:
+        for status in ('queued', 'running'):
+            jobs = current_app.jobs.list(kind='precompute-baskets', status=status)
+            if jobs:
+                return jobs[0]
+        return current_app.jobs.submit('precompute-baskets', run_basket_precompute_job)
+
+
+def run_basket_precompute_job(job):
+    """
+    Bulk basket pre-computation on a dedicated connection (job threads do not share the request pool)
+    """
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    try:
+        summary = precompute_baskets(conn, current_app.ml_engine, progress=job.set_progress, cancelled=job.cancelled)
+    finally:
+        conn.close()
+    print(f"✅ Stored {summary['stored']} predicted baskets for {summary['users']} active users "
+          f"({summary['failed']} failed) in {summary['seconds']}s")
+    return summary
@@ -3,61 +3,99 @@
 Product browsing endpoints
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from database import execute_query, get_db_cursor
+from catalog import format_product
+from pagination import encode_cursor, decode_cursor
+from collections import OrderedDict
 import math
+import threading
+import time
 
 products_bp = Blueprint('products', __name__)
 
+# Sort key column and direction per sort option; the product id breaks ties in the
+# same direction, so (key, id) is a unique position usable as a keyset cursor
+SORT_KEYS = {
+    'name': ('p.name', 'ASC'),
+    'price': ('p.price', 'ASC'),
+    'price_desc': ('p.price', 'DESC'),
+    'relevance': ('relevance', 'DESC')
+}
+
+# Rows every listing and count is built from: products with a category row
+PRODUCTS_FROM = """
+    FROM products p
+    JOIN categories c ON p.department_id = c.department_id
+"""
+
+TOTAL_COUNT_TTL_SECONDS = 60 # How long a filtered product count is reused by cursor pages
+MAX_CACHED_TOTAL_COUNTS = 1000
+_total_counts = OrderedDict()  # (filters, params) -> (expiry time, count), least recently used first
+_total_counts_lock = threading.Lock()  # Shared by all request threads
+
 
 @products_bp.route('', methods=['GET'])
 def get_products():
     """
     Get products with filtering and pagination
+    Page/offset mode by default; passing `after` (empty for the first page)
+    switches to keyset pagination with an opaque `nextCursor`
     """
     try:
         # Parse query parameters
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 20))
-        search = request.args.get('search', '')
+        search = request.args.get('search', '').strip()
         categories = request.args.getlist('categories[]')
-        sort = request.args.get('sort', 'name')
+        sort = request.args.get('sort', 'relevance' if search else 'name')
+        if sort not in SORT_KEYS or (sort == 'relevance' and not search):
+            sort = 'name'
         
         offset = (page - 1) * limit
         
-        # Build query
-        query = """
-            SELECT p.*, c.name as category_name, c.image_url as category_image
-            FROM products p
-            JOIN categories c ON p.department_id = c.department_id
-            WHERE p.is_active = true
-        """
+        # Build query, the total comes with the page (window count) instead of a second scan
         params = []
+        relevance = "0"
+        if search:
+            # Full-text rank (name weighted above description) plus trigram similarity of the name
+            relevance = "ts_rank(p.search_vector, websearch_to_tsquery('english', %s)) + similarity(p.name, %s)"
+            params.extend([search, search])
         
-        # Add search filter
+        filters = "WHERE p.is_active = true"
+        filter_params = []
+        
+        # Add search filter: indexed full-text match (GIN on search_vector) or
+        # partial-word name match (GIN trigram index on name)
         if search:
-            query += " AND (p.name ILIKE %s OR p.description ILIKE %s)"
-            search_pattern = f'%{search}%'
-            params.extend([search_pattern, search_pattern])
+            filters += " AND (p.search_vector @@ websearch_to_tsquery('english', %s) OR p.name ILIKE %s)"
+            filter_params.extend([search, f'%{search}%'])
         
         # Add category filter
         if categories:
             placeholders = ','.join(['%s'] * len(categories))
-            query += f" AND p.department_id IN ({placeholders})"
-            params.extend([int(cat) for cat in categories])
-        
-        # Count total items
-        count_query = f"SELECT COUNT(*) as total FROM ({query}) as filtered"
-        total_result = execute_query(count_query, params, fetch_one=True)
-        total = total_result['total'] if total_result else 0
+            filters += f" AND p.department_id IN ({placeholders})"
+            filter_params.extend([int(cat) for cat in categories])
+        
+        sort_key, direction = SORT_KEYS[sort]
+        order_by = f"{sort_key} {direction}, p.instacart_product_id {direction}"
+        
+        if 'after' in request.args:
+            return get_products_after(
+                request.args.get('after', ''), limit, sort, relevance, params,
+                filters, filter_params, order_by,
+                request.args.get('includeTotal', 'false').lower() == 'true'
+            )
+        
+        query = f"""
+            SELECT p.*, c.name as category_name, c.image_url as category_image,
+                   {relevance} as relevance, COUNT(*) OVER () as total_count
+            {PRODUCTS_FROM}
+            {filters}
+        """
+        params.extend(filter_params)
         
         # Add sorting
-        sort_options = {
-            'name': 'p.name',
-            'price': 'p.price',
-            'price_desc': 'p.price DESC'
-        }
-        order_by = sort_options.get(sort, 'p.name')
         query += f" ORDER BY {order_by}"
         
         # Add pagination
@@ -67,25 +105,16 @@ def get_products():
         # Execute query
         products = execute_query(query, params)
         
+        # Count total items (only needs its own query when the page is past the end)
+        if products:
+            total = products[0]['total_count']
+        elif offset > 0:
+            total = get_total_count(filters, filter_params)
+        else:
+            total = 0
+        
         # Format products
-        formatted_products = []
-        for product in products:
-            formatted_products.append({
-                'id': str(product['instacart_product_id']),
-                'sku': f"SKU-{product['instacart_product_id']}",
-                'name': product['name'],
-                'description': product['description'],
-                'price': float(product['price']),
-                'brand': product['brand'],
-                'imageUrl': product['image_url'] or product['category_image'],
-                'category': {
-                    'id': str(product['department_id']),
-                    'name': product['category_name']
-                },
-                'stock': 100,  # Default stock
-                'isActive': product['is_active'],
-                'metadata': {}
-            })
+        formatted_products = [format_product(product) for product in products]
         
         return jsonify({
             'products': formatted_products,
@@ -100,6 +129,90 @@ def get_products():
         return jsonify({'error': 'Failed to fetch products'}), 500
 
 
+def get_products_after(after, limit, sort, relevance, relevance_params, filters, filter_params, order_by, include_total):
+    """
+    Keyset page: the rows following the cursor position in (sort key, product id) order,
+    found through the index instead of skipping OFFSET rows
+    """
+    try:
+        position = decode_cursor(after)
+        if position and (position.get('sort') != sort or 'key' not in position or 'id' not in position):
+            raise ValueError('Cursor does not match this sort order')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    sort_key, direction = SORT_KEYS[sort]
+    params = list(relevance_params) + list(filter_params)
+    
+    # Rows strictly after the last (key, id) of the previous page
+    page_filters = filters
+    if position:
+        comparison = '>' if direction == 'ASC' else '<'
+        key_expression = f"({relevance})" if sort == 'relevance' else sort_key
+        key_cast = '::real' if sort == 'relevance' else ''
+        page_filters += f" AND ({key_expression}, p.instacart_product_id) {comparison} (%s{key_cast}, %s)"
+        if sort == 'relevance':
+            params.extend(relevance_params)
+        params.extend([position['key'], position['id']])
+    
+    # One extra row tells whether another page follows
+    products = execute_query(f"""
+        SELECT p.*, c.name as category_name, c.image_url as category_image,
+               {relevance} as relevance
+        {PRODUCTS_FROM}
+        {page_filters}
+        ORDER BY {order_by}
+        LIMIT %s
+    """, params + [limit + 1])
+    
+    has_more = len(products) > limit
+    products = products[:limit]
+    next_cursor = None
+    if has_more and products:
+        last = products[-1]
+        next_cursor = encode_cursor({
+            'sort': sort,
+            'key': last['relevance'] if sort == 'relevance' else last[sort_key.split('.')[1]],
+            'id': last['instacart_product_id']
+        })
+    
+    response = {
+        'products': [format_product(product) for product in products],
+        'nextCursor': next_cursor,
+        'hasMore': has_more
+    }
+    if include_total:
+        response['total'] = get_total_count(filters, filter_params)
+    return jsonify(response)
+
+
+def get_total_count(filters, filter_params):
+    """
+    Filtered product count over the same rows as the listing (PRODUCTS_FROM),
+    reused for TOTAL_COUNT_TTL_SECONDS so that cursor pages do not pay for a full count each
+    """
+    key = (filters, tuple(filter_params))
+    with _total_counts_lock:
+        cached = _total_counts.get(key)
+        if cached and cached[0] > time.monotonic():
+            _total_counts.move_to_end(key)
+            return cached[1]
+    
+    total_result = execute_query(f"""
+        SELECT COUNT(*) as total
+        {PRODUCTS_FROM}
+        {filters}
+    """, filter_params, fetch_one=True)
+    total = total_result['total'] if total_result else 0
+    
+    with _total_counts_lock:
+        _total_counts[key] = (time.monotonic() + TOTAL_COUNT_TTL_SECONDS, total)
+        _total_counts.move_to_end(key)
+        while len(_total_counts) > MAX_CACHED_TOTAL_COUNTS:
+            _total_counts.popitem(last=False)
+    return total
+
+
 @products_bp.route('/<string:product_id>', methods=['GET'])
 def get_product(product_id):
     """
@@ -112,32 +225,12 @@ def get_product(product_id):
         except ValueError:
             return jsonify({'error': 'Invalid product ID'}), 400
             
-        product = execute_query("""
-            SELECT p.*, c.name as category_name, c.image_url as category_image
-            FROM products p
-            JOIN categories c ON p.department_id = c.department_id
-            WHERE p.instacart_product_id = %s
-        """, [product_id_int], fetch_one=True)
+        product = current_app.catalog.product(product_id_int)
         
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
-        return jsonify({
-            'id': str(product['instacart_product_id']),
-            'sku': f"SKU-{product['instacart_product_id']}",
-            'name': product['name'],
-            'description': product['description'],
-            'price': float(product['price']),
-            'brand': product['brand'],
-            'imageUrl': product['image_url'] or product['category_image'],
-            'category': {
-                'id': str(product['department_id']),
-                'name': product['category_name']
-            },
-            'stock': 100,
-            'isActive': product['is_active'],
-            'metadata': {}
-        })
+        return jsonify(product)
         
     except Exception as e:
         print(f"Get product error: {str(e)}")
@@ -150,23 +243,8 @@ def get_categories():
     Get all product categories
     """
     try:
-        categories = execute_query("""
-            SELECT department_id, name, description, image_url, is_active
-            FROM categories
-            WHERE is_active = true
-            ORDER BY name
-        """)
-        
-        formatted_categories = []
-        for cat in categories:
-            formatted_categories.append({
-                'id': str(cat['department_id']),
-                'name': cat['name'],
-                'description': cat['description'],
-                'imageUrl': cat['image_url']
-            })
-        
-        return jsonify(formatted_categories)
+        # Pre-serialized active categories from the in-memory catalog
+        return jsonify(current_app.catalog.get_categories())
         
     except Exception as e:
         print(f"Get categories error: {str(e)}")
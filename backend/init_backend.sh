@@ -31,6 +31,13 @@ while [ ! -f "$DB_POPULATED_FLAG" ]; do
 done
 echo "✅ Database population completed!"
 
+# init.sql only runs on a fresh database volume, bring an existing one up to date
+echo "🗄️  Upgrading database schema..."
+if ! python upgrade_schema.py; then
+    echo "❌ Database schema upgrade failed"
+    exit 1
+fi
+
 # Copy dataset to local data directory for ML processing
 echo "Setting up ML data directories..."
 mkdir -p /app/data/dataset
@@ -77,6 +84,18 @@ else
     echo "✅ ML data already preprocessed, skipping..."
 fi
 
+# Columnar history store, rebuilt separately for datasets preprocessed before it existed
+if [ ! -d /app/data/dataset/data_history ]; then
+    echo "📚 Building history store from instacart_history.csv..."
+    (cd /app/ml_engine/build && python -c "from create_model_data import create_history_store; create_history_store()")
+fi
+
+# Ground-truth index, built separately for datasets preprocessed before it existed
+if [ ! -d /app/data/dataset/data_future ]; then
+    echo "🎯 Building ground-truth index from instacart_future.csv..."
+    (cd /app/ml_engine/build && python -c "from create_model_data import create_ground_truth_store; create_ground_truth_store()")
+fi
+
 # Pre-compute user vectors
 if [ ! -f "$VECTORS_FLAG" ]; then
     echo "🧮 Pre-computing recommender user vectors..."
@@ -97,6 +116,9 @@ fi
 
 echo "⭐ ML Engine ready!"
 
+# Stored predicted baskets are refreshed by a background job once the server is up
+# (app.py, 'precompute-baskets'), predictions are served live until they are stored
+
 echo "=========================================="
 echo "🚀 Starting Flask backend server..."
 echo "=========================================="
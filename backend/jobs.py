@@ -0,0 +1,166 @@
+# backend/jobs.py
+"""
+In-process background jobs for long admin operations (evaluation, seeding, precompute)
+A job runs on a thread of the registry's pool inside the Flask app context and
+reports its progress on the Job object, which the endpoints serialize for polling.
+Cancellation is cooperative: a queued job never starts, a running one stops at the
+next point where its runner checks job.cancelled().
+"""
+
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2')) # Jobs running at the same time, the rest wait queued
+MAX_FINISHED_JOBS = 100 # Finished jobs kept for polling, oldest are forgotten first
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class Job:
+    """
+    State of one background job, updated by its runner and read by pollers
+    """
+
+    def __init__(self, kind: str, params: Optional[Dict] = None, cancellable: bool = True):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.params = params or {}
+        self.cancellable = cancellable
+        self.cancel_requested = False
+        self.status = 'queued'
+        self.total = 0
+        self.done = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def set_total(self, total: int):
+        self.total = total
+
+    def set_progress(self, done: int, total: int):
+        self.done, self.total = done, total
+
+    def advance(self, count: int = 1):
+        """Mark count more units of work (users, batches...) as done"""
+        with self._lock:
+            self.done += count
+
+    def cancelled(self) -> bool:
+        """Polled by runners between units of work"""
+        return self.cancel_requested
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> Dict:
+        finished_at = self.finished_at or time.time()
+        return {
+            'jobId': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'params': self.params,
+            'cancellable': self.cancellable,
+            'cancelRequested': self.cancel_requested,
+            'progress': {
+                'done': self.done,
+                'total': self.total,
+                'percent': round(100.0 * self.done / self.total, 1) if self.total else 0.0
+            },
+            'result': self.result,
+            'error': self.error,
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at,
+            'elapsedSeconds': round(finished_at - self.started_at, 2) if self.started_at else 0.0
+        }
+
+
+class JobRegistry:
+    """
+    Thread pool + id -> Job map, shared by all requests of the process (app.jobs).
+    Jobs live in this process only: they are lost on restart and only visible to
+    the backend process that accepted them.
+    """
+
+    def __init__(self, app, max_workers: int = JOB_WORKERS):
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, runner: Callable, params: Optional[Dict] = None, cancellable: bool = True) -> Job:
+        """
+        Queue runner(job) in the background, returns the job right away.
+        The runner's return value becomes job.result, an exception marks the job failed.
+        Runners of cancellable jobs should stop early once job.cancelled() is true.
+        """
+        job = Job(kind, params, cancellable)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_finished()
+        self._executor.submit(self._run, job, runner)
+        return job
+
+    def _run(self, job: Job, runner: Callable):
+        with self._lock:
+            if job.finished:  # cancelled while queued
+                return
+            job.status = 'running'
+        job.started_at = time.time()
+        print(f"🛠️ Job {job.kind} {job.id} started")
+        try:
+            with self.app.app_context():
+                job.result = runner(job)
+            job.status = 'cancelled' if job.cancel_requested else 'completed'
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.time()
+        print(f"✅ Job {job.kind} {job.id} {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, kind: Optional[str] = None, status: Optional[str] = None) -> List[Job]:
+        """Known jobs, newest first"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in reversed(jobs)
+                if (kind is None or job.kind == kind) and (status is None or job.status == status)]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancel a job: a queued one is dropped right away, a running one is asked
+        to stop (its partial result is kept). None when the job is unknown.
+        Raises ValueError for running jobs that cannot be interrupted.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            if job.status == 'queued':
+                job.cancel_requested = True
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+                return job
+            if not job.cancellable:
+                raise ValueError(f'Job {job.kind} cannot be cancelled once running')
+            job.cancel_requested = True
+            return job
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
@@ -9,28 +9,40 @@ STRICT: Fails immediately if required data files are missing
 import os
 import numpy as np
 import json
-import pickle
 import random
+import time
+import threading
+from concurrent.futures import as_completed
+from itertools import chain
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from sklearn.neighbors import NearestNeighbors
-import pandas as pd
+from scipy import sparse
 
-# TIFUKNN Configuration (hardcoded as per paper)
-WITHIN_DECAY_RATE = 0.9
-GROUP_DECAY_RATE = 0.7
-GROUP_SIZE = 3
-ALPHA = 0.9
+from .history_store import UserHistoryStore
+from .vector_store import RecommenderVectorStore
+from .knn_index import KnnIndex
+from .params import TifuKnnParams, stamp_vector_params, vector_params_hash
+from .generation import VectorGeneration
+from .workers import worker_pool, worker_state
+
+# TIFUKNN Configuration (paper values unless overridden, see TifuKnnParams)
+WITHIN_DECAY_RATE = float(os.getenv("WITHIN_DECAY_RATE", "0.9"))
+GROUP_DECAY_RATE = float(os.getenv("GROUP_DECAY_RATE", "0.7"))
+GROUP_SIZE = int(os.getenv("GROUP_SIZE", "3"))
+ALPHA = float(os.getenv("ALPHA", "0.9"))
 
 # Basket size 
 TOPK = int(os.getenv("PREDICTED_BASKET_SIZE")) 
 
 # Production and Runtime Optimizations
-MATRIX_NEIGHBOR_KNN_SEARCH_LIMIT = int(os.getenv("MATRIX_NEIGHBOR_KNN_SEARCH_LIMIT"))  # KNN search optimization, affects the size of the the vector matrix in real time calculation.
-MAX_RECOMMENDER_VECTORS_LOAD = int(os.getenv("MAX_RECOMMENDER_VECTORS_LOAD")) # Limit to avoid memory issues, managed during the build process
+MAX_RECOMMENDER_VECTORS_LOAD = int(os.getenv("MAX_RECOMMENDER_VECTORS_LOAD")) # Limit on precomputed vectors, -1 means every train user in the keyset
 KNN_K = int(os.getenv("KNN_K")) # must be proportional to MAX_RECOMMENDER_VECTORS_LOAD
+PRECOMPUTE_WORKERS = int(os.getenv("PRECOMPUTE_WORKERS", os.cpu_count() or 1)) # Worker processes for the vector pre-computation
+PRECOMPUTE_SHARD_SIZE = 1000 # Recommender users per pre-computation shard
+VECTOR_PARAMS_MISMATCH = os.getenv("VECTOR_PARAMS_MISMATCH", "rebuild") # Stored vectors built with other parameters: 'rebuild' (serve them until rebuilt) or 'refuse' (fail startup)
+VECTOR_RELOAD_CHECK_SECONDS = float(os.getenv("VECTOR_RELOAD_CHECK_SECONDS", "30")) # How often the served process checks the persisted store for a hot reload, 0 disables it
 
 # Updated paths for new structure
 DATA_PATH = Path('/app/data')
@@ -46,6 +58,15 @@ DATABASE_CONFIG = {
     'password': 'timely_password'
 }
 
+DEFAULT_PARAMS = TifuKnnParams(
+    k=KNN_K,
+    topk=TOPK,
+    within_decay=WITHIN_DECAY_RATE,
+    group_decay=GROUP_DECAY_RATE,
+    group_size=GROUP_SIZE,
+    alpha=ALPHA
+)
+
 
 class TifuKnnEngine:
     """
@@ -53,22 +74,41 @@ class TifuKnnEngine:
         - optimized for production use
         - supporting both DB and CSV data
         - maintain same logic
+    Parameters, recommender vectors and KNN index are served together as one
+    VectorGeneration; a new configuration is built and warmed as a second
+    generation while the current one keeps serving, then swapped in (activate).
     """
     
-    def __init__(self):
-        self.csv_data_history = None  # Original Instacart data
+    def __init__(self, params: Optional[TifuKnnParams] = None):
+        """
+        Args:
+            params: configuration to serve, defaults to DEFAULT_PARAMS (environment).
+                    Stored vectors stamped with other vector parameters are refused or
+                    served until rebuilt, see VECTOR_PARAMS_MISMATCH.
+        """
+        self.csv_data_history = None  # Original Instacart data (columnar basket store)
+        self.ground_truth = None  # Future basket of every dataset user (one-basket store)
         self.keyset = None
         self.item_count = None
-        self.recommender_vectors = {}  # Pre-computed recommender vectors cache
+        self.generation = None  # Served generation: params + recommender vectors + KNN index
+        self.warming = None  # Generation being built and warmed, swapped in when ready
+        self.pending_params = None  # Requested params whose vectors are not built yet
+        self.last_reload = None  # Report of the latest hot reload
+        self._failed_reload_version = None  # Store version the watch could not reload, retried once replaced again
+        self.activation_listeners = []  # Called with (new generation, previous generation) after every swap
+        self._build_lock = threading.Lock()  # One vector build or reload at a time, they share the store directory
         
         """Load essential data files - STRICT: fails immediately if files missing"""
         print("🔧 Loading ML engine base data...")
         
-        # Load CSV data history
-        history_path = DATASET_PATH / 'data_history.json'
-        with open(history_path, 'r') as f:
-            self.csv_data_history = json.load(f)    
-            print(f"✅ Loaded CSV data history for {len(self.csv_data_history)} users")
+        # Open CSV data history (memory mapped, histories are read per user on demand)
+        history_path = DATASET_PATH / 'data_history'
+        self.csv_data_history = UserHistoryStore.open(history_path)
+        print(f"✅ Opened CSV data history for {len(self.csv_data_history)} users")
+        
+        # Open the ground-truth index (user id -> future basket) used by the evaluations
+        self.ground_truth = UserHistoryStore.open(DATASET_PATH / 'data_future')
+        print(f"✅ Opened ground truth for {len(self.ground_truth)} users")
         
         # Load keyset (train/val/test splits)
         keyset_path = DATASET_PATH / 'instacart_keyset_0.json'
@@ -80,215 +120,751 @@ class TifuKnnEngine:
         print(f"✅ Val users: {len(self.keyset.get('val', []))}")
         print(f"✅ Test users: {len(self.keyset.get('test', []))}")
         
-        # Load pre-computed recommender vectors from disk
-        vectors_file = VECTORS_PATH / 'recommender_vectors.pkl'
-        if vectors_file.exists():
-            with open(vectors_file, 'rb') as f:
-                self.recommender_vectors = pickle.load(f)
-                print(f"✅ Loaded {len(self.recommender_vectors)} pre-computed recommender vectors")
-        else:
-            print(f"⚠️  No pre-computed recommender vectors found at {vectors_file}. Need to precompute vectors first")
+        # Open pre-computed recommender vectors from disk (memory mapped, no deserialization)
+        self.generation = self._open_generation(params or DEFAULT_PARAMS)
+        print(f"✅ Serving parameters {self.params.vector_hash}: {self.params.to_dict()}")
+    
+    @property
+    def params(self) -> TifuKnnParams:
+        """Parameters of the served generation"""
+        return self.generation.params
+    
+    @property
+    def recommender_vectors(self) -> RecommenderVectorStore:
+        """Pre-computed recommender vectors of the served generation (sparse store)"""
+        return self.generation.store
+    
+    @property
+    def knn_index(self) -> Optional[KnnIndex]:
+        """Prebuilt cosine index over the served recommender vectors"""
+        return self.generation.knn_index
+    
+    def _open_generation(self, params: TifuKnnParams) -> VectorGeneration:
+        """
+        Open the persisted recommender vectors as a generation serving params
+        The store's stamp must match the vector parameters and item count. On a
+        mismatch startup fails (VECTOR_PARAMS_MISMATCH=refuse), or the stored vectors
+        keep serving with the parameters they were built with and params are left
+        pending until a pre-computation builds them (rebuild)
+        """
+        vectors_dir = VECTORS_PATH / 'recommender_vectors'
+        legacy_vectors_file = VECTORS_PATH / 'recommender_vectors.pkl'
+        if not RecommenderVectorStore.exists(vectors_dir) and legacy_vectors_file.exists():
+            print(f"🔄 Converting {legacy_vectors_file} to the memory-mapped store format")
+            RecommenderVectorStore.load_legacy_pickle(legacy_vectors_file, self.item_count).save(vectors_dir)
+        if not RecommenderVectorStore.exists(vectors_dir):
+            print(f"⚠️  No pre-computed recommender vectors found at {vectors_dir}. Need to precompute vectors first")
+            return VectorGeneration(params, RecommenderVectorStore.empty(self.item_count), source='empty')
         
-    def precompute_recommender_vectors(self):
+        version = RecommenderVectorStore.version(vectors_dir)
+        store = RecommenderVectorStore.open(vectors_dir)
+        print(f"✅ Opened {len(store)} pre-computed recommender vectors "
+              f"({store.nbytes / 2**20:.1f} MB sparse, memory mapped)")
+        stored_params = params.with_vector_params(stamp_vector_params(store.stamp))
+        
+        if stored_params.vector_hash != params.vector_hash or store.item_count != self.item_count:
+            mismatch = (f"recommender vectors were built with {stamp_vector_params(store.stamp)} over "
+                        f"{store.item_count} items, the engine is configured with {params.vector_params()} "
+                        f"over {self.item_count} items")
+            if VECTOR_PARAMS_MISMATCH == 'refuse':
+                raise RuntimeError(f"Refusing to serve: {mismatch}. Precompute the vectors again")
+            print(f"⚠️  {mismatch}, serving the stored vectors until they are rebuilt")
+            self.pending_params = params
+            if store.item_count != self.item_count:
+                # Vectors over another catalog cannot be searched at all
+                return VectorGeneration(stored_params, RecommenderVectorStore.empty(self.item_count),
+                                        source='empty', version=version)
+            params = stored_params
+        
+        # Load (or build once) the KNN index over the recommender vectors
+        knn_index = self._load_knn_index(store) if len(store) > 0 else None
+        return VectorGeneration(params, store, knn_index, version=version)
+    
+    def _load_knn_index(self, store: RecommenderVectorStore) -> KnnIndex:
+        """
+        Load the persisted KNN index, rebuilding it when it is missing
+        or was built over a different vector store
+        """
+        vectors_dir = VECTORS_PATH / 'recommender_vectors'
+        if KnnIndex.exists(vectors_dir):
+            knn_index = KnnIndex.load(vectors_dir, store)
+            if knn_index.matches(store):
+                print(f"✅ Loaded KNN index over {len(knn_index)} recommender vectors")
+                return knn_index
+            print("⚠️  KNN index does not match the recommender vectors, rebuilding")
+        
+        knn_index = KnnIndex.build(store)
+        try:
+            knn_index.save(vectors_dir)
+            print(f"✅ Built KNN index over {len(knn_index)} recommender vectors, saved to: {vectors_dir}")
+        except OSError as e:
+            print(f"⚠️  Built KNN index but could not persist it: {e}")
+        return knn_index
+    
+    def activate(self, generation: VectorGeneration) -> VectorGeneration:
+        """
+        Serve a built generation from now on and return the previous one
+        The swap is a single reference assignment: requests in flight finish on the
+        generation they started with, later requests get the new one
+        """
+        if not generation.warmed:
+            generation.warm()
+        previous = self.generation
+        self.generation = generation
+        if self.pending_params is not None and self.pending_params.vector_hash == generation.params.vector_hash:
+            self.pending_params = None
+        print(f"🔁 Serving generation {generation.params.vector_hash} ({len(generation.store)} vectors, "
+              f"{generation.source}), previously {previous.params.vector_hash if previous else None}")
+        for listener in self.activation_listeners:
+            try:
+                listener(generation, previous)
+            except Exception as e:
+                print(f"⚠️  Generation swap listener failed: {e}")
+        return previous
+    
+    def reconfigure(self, params: TifuKnnParams) -> bool:
+        """
+        Switch to new parameters
+        Query-time parameters (alpha, k, topk) are swapped in at once over the same
+        vectors; new vector parameters are left pending for precompute_recommender_vectors
+
+        Returns:
+            True when params are served now, False when their vectors must be built first
+        """
+        generation = self.generation
+        if params.vector_hash == generation.params.vector_hash:
+            self.pending_params = None
+            self.activate(generation.with_params(params))
+            return True
+        self.pending_params = params
+        return False
+
+    def reload_recommender_vectors(self, force: bool = False) -> Dict:
+        """
+        Hot reload the persisted recommender vectors (replaced by an offline or other
+        process' pre-computation) as a new generation, warm it and swap it in
+        Requests keep being served by the current generation while it loads and are
+        never blocked: the swap is activate's single reference assignment.
+        
+        Args:
+            force: reload even when the store on disk is the one being served
+        
+        Returns:
+            {'reloaded', 'vectors', 'paramsHash', 'previousParamsHash', 'loadSeconds',
+             'warmSeconds', 'seconds', 'rssMB', 'peakMemoryDeltaMB', 'memoryDeltaMB'}
+        """
+        with self._build_lock:
+            return self._reload_recommender_vectors(force)
+    
+    def _reload_recommender_vectors(self, force: bool) -> Dict:
+        vectors_dir = VECTORS_PATH / 'recommender_vectors'
+        version = RecommenderVectorStore.version(vectors_dir)
+        if version is None:
+            raise FileNotFoundError(f"No pre-computed recommender vectors found at {vectors_dir}")
+        if version == self.generation.version and not force:
+            return {'reloaded': False, 'vectors': len(self.recommender_vectors), 'paramsHash': self.params.vector_hash}
+        
+        rss_before = _process_rss_mb()
+        started = time.perf_counter()
+        store = RecommenderVectorStore.open(vectors_dir)
+        if store.item_count != self.item_count:
+            raise ValueError(f"Recommender vectors cover {store.item_count} items, the dataset has {self.item_count}")
+        
+        # Vector parameters come from the stamp, query-time ones from the configuration they belong to
+        stored_vector_params = stamp_vector_params(store.stamp)
+        target = self.pending_params or self.params
+        if vector_params_hash(stored_vector_params) != target.vector_hash:
+            if VECTOR_PARAMS_MISMATCH == 'refuse':
+                raise RuntimeError(f"Refusing to reload: recommender vectors were built with {stored_vector_params}, "
+                                   f"the engine is configured with {target.vector_params()}")
+            target = self.params
+        knn_index = self._load_knn_index(store) if len(store) > 0 else None
+        generation = VectorGeneration(target.with_vector_params(stored_vector_params), store, knn_index,
+                                      source='reload', version=version)
+        load_seconds = time.perf_counter() - started
+        
+        self.warming = generation
+        try:
+            generation.warm()
+        finally:
+            self.warming = None
+        warm_seconds = time.perf_counter() - started - load_seconds
+        rss_loaded = _process_rss_mb()
+        
+        previous = self.activate(generation)
+        previous_hash = previous.params.vector_hash
+        # The previous generation is freed once the requests still using it finish
+        previous = None
+        rss_after = _process_rss_mb()
+        
+        self.last_reload = {
+            'reloaded': True,
+            'vectors': len(store),
+            'paramsHash': generation.params.vector_hash,
+            'previousParamsHash': previous_hash,
+            'loadSeconds': round(load_seconds, 3),
+            'warmSeconds': round(warm_seconds, 3),
+            'seconds': round(time.perf_counter() - started, 3),
+            'rssMB': rss_after,
+            'peakMemoryDeltaMB': round(rss_loaded - rss_before, 1) if rss_before is not None else None,
+            'memoryDeltaMB': round(rss_after - rss_before, 1) if rss_before is not None else None,
+            'reloadedAt': time.time()
+        }
+        print(f"✅ Reloaded {len(store)} recommender vectors in {self.last_reload['seconds']:.2f}s "
+              f"(memory delta {self.last_reload['memoryDeltaMB']} MB)")
+        return self.last_reload
+    
+    def watch_recommender_vectors(self, interval_seconds: float = VECTOR_RELOAD_CHECK_SECONDS) -> Optional[threading.Thread]:
+        """
+        Check the persisted store every interval_seconds from a daemon thread and hot
+        reload it once it was replaced (file-watch trigger); 0 disables the watch
+        """
+        if interval_seconds <= 0:
+            return None
+        
+        def watch():
+            while True:
+                time.sleep(interval_seconds)
+                self._reload_if_replaced()
+        
+        thread = threading.Thread(target=watch, name='recommender-vectors-watch', daemon=True)
+        thread.start()
+        return thread
+    
+    def _reload_if_replaced(self):
+        version = RecommenderVectorStore.version(VECTORS_PATH / 'recommender_vectors')
+        if version is None or version in (self.generation.version, self._failed_reload_version):
+            return
+        # A build or reload in progress swaps its own generation in
+        if not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            print("🔄 Recommender vectors replaced on disk, reloading")
+            self._reload_recommender_vectors(force=False)
+        except Exception as e:
+            self._failed_reload_version = version
+            print(f"⚠️  Recommender vector reload failed: {e}")
+        finally:
+            self._build_lock.release()
+    
+    def precompute_recommender_vectors(self, workers: Optional[int] = None,
+                                       progress: Optional[Callable[[int, int], None]] = None,
+                                       params: Optional[TifuKnnParams] = None) -> Dict:
         """
         Pre-compute vectors for all recommender users
         This enables fast KNN search during predictions
+        The vectors are built as a new generation next to the served one, persisted
+        with the stamp of their parameters, warmed and then swapped in
+
+        Args:
+            workers: number of worker processes, defaults to PRECOMPUTE_WORKERS.
+                     Train users are split into shards of PRECOMPUTE_SHARD_SIZE users,
+                     each shard's vectors are computed by one worker and the shards
+                     are merged into the persisted store.
+            progress: called with (users processed, users selected) after every shard
+            params: parameters to build with, defaults to the pending ones, else the served ones
+
+        Returns:
+            {'computed': vectors saved, 'skipped': users skipped, 'seconds': elapsed, 'paramsHash'}
         """
-        print("⚒️  Start precompute vectors")
-        print(f"⚡ Limiting vector computation to {MAX_RECOMMENDER_VECTORS_LOAD} users for feasible memory load")
+        with self._build_lock:
+            return self._precompute_recommender_vectors(workers, progress, params)
+    
+    def _precompute_recommender_vectors(self, workers: Optional[int], progress: Optional[Callable[[int, int], None]],
+                                        params: Optional[TifuKnnParams]) -> Dict:
+        workers = max(1, workers or PRECOMPUTE_WORKERS)
+        params = params or self.pending_params or self.params
+        print(f"⚒️  Start precompute vectors ({workers} worker{'s' if workers > 1 else ''}, parameters {params.vector_hash})")
         VECTORS_PATH.mkdir(parents=True, exist_ok=True)
-        vectors_file = VECTORS_PATH / 'recommender_vectors.pkl'
+        vectors_dir = VECTORS_PATH / 'recommender_vectors'
         
         all_recommender_users = [str(uid) for uid in self.keyset.get('train', [])] ; len_all_recommender_users = len(all_recommender_users)
-        computed_vectors = {}
-        computed = 0
-        skipped = 0
-
-        while computed < MAX_RECOMMENDER_VECTORS_LOAD and len(all_recommender_users)>0:
-            random_index = random.randrange(len(all_recommender_users))
-            random_user_id = all_recommender_users.pop(random_index)       
+        max_vectors = MAX_RECOMMENDER_VECTORS_LOAD if MAX_RECOMMENDER_VECTORS_LOAD > 0 else len_all_recommender_users
         
-            if random_user_id in self.csv_data_history:
-                user_history = self.csv_data_history[random_user_id]
-                
-                if len(user_history) >= 3:  # user_id + at least 2 baskets
-                    vector = self._compute_user_vector(user_history)
-                    if vector is not None and np.sum(vector) > 0:
-                        computed_vectors[random_user_id] = vector
-                        computed += 1
-                    else:
-                        skipped += 1
-                else:
-                    skipped += 1
-            else:
-                skipped += 1
-            
-            if (computed + skipped) % 1000 == 0:
-                print(f"Progress: {computed + skipped}/{len_all_recommender_users}")
+        # Random subset of the users that have enough history
+        random.shuffle(all_recommender_users)
+        eligible_users = [uid for uid in all_recommender_users
+                          if self.csv_data_history.basket_count(uid) >= 2]  # at least 2 baskets
+        skipped = len_all_recommender_users - len(eligible_users)
+        if max_vectors < len(eligible_users):
+            print(f"⚡ Limiting vector computation to {max_vectors} users")
+            skipped += len(eligible_users) - max_vectors
+            eligible_users = eligible_users[:max_vectors]
+        
+        shards = [eligible_users[i:i + PRECOMPUTE_SHARD_SIZE]
+                  for i in range(0, len(eligible_users), PRECOMPUTE_SHARD_SIZE)]
+        progress = _PrecomputeProgress(len(eligible_users), progress)
+        shard_results = []
+        
+        # Forked workers inherit this engine (and its loaded history) copy-on-write;
+        # inside the threaded backend the shards are computed in process (workers.py)
+        pool = worker_pool(workers, (self,)) if len(shards) > 1 else None
+        if pool is not None:
+            with pool:
+                futures = {pool.submit(_compute_vector_shard, shard, params): shard_idx for shard_idx, shard in enumerate(shards)}
+                shard_results = [None] * len(shards)
+                for future in as_completed(futures):
+                    shard_results[futures[future]] = future.result()
+                    progress.update(len(shards[futures[future]]))
+        else:
+            for shard in shards:
+                shard_results.append(self._compute_vector_shard(shard, params))
+                progress.update(len(shard))
         
-        # Save all computed vectors at the end
+        # Merge the shards (in shard order) and save all computed vectors at the end
         try:
-            with open(vectors_file, 'wb') as f:
-                pickle.dump(computed_vectors, f)    
-            self.recommender_vectors = computed_vectors
-            print(f"✅ Pre-computation complete: {computed} vectors saved, {skipped} skipped")
-            print(f"📁 Vectors saved to: {vectors_file}")
+            computed_user_ids = [uid for shard_user_ids, _, _ in shard_results for uid in shard_user_ids]
+            skipped += sum(shard_skipped for _, _, shard_skipped in shard_results)
+            computed = len(computed_user_ids)
+            if computed:
+                computed_vectors = RecommenderVectorStore(
+                    computed_user_ids,
+                    sparse.vstack([matrix for _, matrix, _ in shard_results if matrix.shape[0]], format='csr')
+                )
+            else:
+                computed_vectors = RecommenderVectorStore.empty(self.item_count)
+            computed_vectors.stamp = params.stamp(self.item_count)
+            # The store and its index are swapped in together, the served generation
+            # keeps its memory maps of the replaced files
+            computed_vectors.save(vectors_dir, extras=KnnIndex.build(computed_vectors).save)
+            # Serve from the memory-mapped copy, like a freshly started engine would
+            version = RecommenderVectorStore.version(vectors_dir)
+            store = RecommenderVectorStore.open(vectors_dir)
+            self.warming = VectorGeneration(params, store, KnnIndex.load(vectors_dir, store),
+                                            source='precompute', version=version)
+            self.warming.warm()
+            self.activate(self.warming)
+            print(f"✅ Pre-computation complete: {computed} vectors saved, {skipped} skipped "
+                  f"({computed_vectors.nbytes / 2**20:.1f} MB sparse) in {progress.elapsed_str()}")
+            print(f"📁 Vectors and KNN index saved to: {vectors_dir}")
+            return {'computed': computed, 'skipped': skipped, 'seconds': round(progress.elapsed(), 2),
+                    'paramsHash': params.vector_hash}
             
         except Exception as e:
             raise RuntimeError(f"❌ Failed to save pre-computed vectors: {e}")
+        finally:
+            self.warming = None
+    
+    def _compute_vector_shard(self, user_ids: List[str],
+                              params: Optional[TifuKnnParams] = None) -> Tuple[List[str], sparse.csr_matrix, int]:
+        """
+        Compute the vectors of one shard of recommender users with params (default: served ones)
+
+        Returns:
+            (computed user ids, their vectors as CSR rows, number of skipped users)
+        """
+        computed_user_ids = []
+        computed_rows = []  # one sparse row per user, never more than one dense vector alive
+        skipped = 0
+        
+        for user_id in user_ids:
+            vector = self._compute_flat_user_vector(*self.csv_data_history.flat(user_id), params)
+            if vector is not None and np.sum(vector) > 0:
+                computed_user_ids.append(user_id)
+                computed_rows.append(sparse.csr_matrix(vector))
+            else:
+                skipped += 1
+        
+        if not computed_rows:
+            return [], sparse.csr_matrix((0, self.item_count), dtype=np.float64), skipped
+        return computed_user_ids, sparse.vstack(computed_rows, format='csr'), skipped
         
-    def _compute_user_vector(self, user_history: List[List[int]]) -> Optional[np.ndarray]:
+    def _compute_flat_user_vector(self, items: np.ndarray, basket_sizes: np.ndarray,
+                                  params: Optional[TifuKnnParams] = None) -> Optional[np.ndarray]:
         """
-        Compute user vector from purchase history
+        Compute user vector from a flattened purchase history (see _temporal_decay_sum_flat)
         """
         try:
-            return self._temporal_decay_sum_history(user_history)
+            if len(basket_sizes) < 2:  # Need at least 2 baskets
+                return np.zeros(self.item_count)
+            return self._temporal_decay_sum_flat(items, basket_sizes, params)
         except Exception as e:
             print(f"Error computing user vector: {e}")
             return None
     
-    def _temporal_decay_sum_history(self, user_history: List[List[int]]) -> np.ndarray:
+    @staticmethod
+    def _flatten_history(user_history: List) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Flatten a [user_id, basket1, basket2, ...] history into one item array plus per-basket sizes
+        """
+        # Skip user_id (first element)
+        baskets = user_history[1:] if user_history and isinstance(user_history[0], (int, np.integer)) else user_history
+        basket_sizes = np.fromiter((len(basket) for basket in baskets), dtype=np.int64, count=len(baskets))
+        items = np.fromiter(chain.from_iterable(baskets), dtype=np.int64, count=int(basket_sizes.sum()))
+        return items, basket_sizes
+    
+    def _temporal_decay_sum_flat(self, items: np.ndarray, basket_sizes: np.ndarray,
+                                 params: Optional[TifuKnnParams] = None) -> np.ndarray:
         """
-        Compute user vector using temporal decay and within-basket grouping
+        Vectorized temporal decay sum over a flattened history
+
+        Args:
+            items: all item ids of the user's baskets, oldest basket first
+            basket_sizes: number of items in each basket
+            params: decay parameters, defaults to the served generation's
         """
-        if not user_history or len(user_history) < 3:  # Need at least user_id + 2 basket
-            return np.zeros(self.item_count)
+        params = params or self.params
+        n_baskets = len(basket_sizes)
+        basket_ids = np.repeat(np.arange(n_baskets), basket_sizes)
+        basket_starts = np.cumsum(basket_sizes) - basket_sizes
+        position_in_basket = np.arange(len(items)) - np.repeat(basket_starts, basket_sizes)
         
-        # Initialize vector
-        final_vector = np.zeros(self.item_count)
+        # Within-group decay: position inside its group_size chunk of the basket.
+        # Decay powers come from small lookup tables built with Python's pow, so
+        # they are bit-identical to the scalar weights (NumPy's SIMD power is not)
+        within_group_table = np.array([params.within_decay ** item_idx for item_idx in range(params.group_size)])
+        within_group_weights = within_group_table[position_in_basket % params.group_size]
         
-        # Skip user_id (first element) and process baskets
-        baskets = user_history[1:] if isinstance(user_history[0], int) else user_history
+        valid = (items >= 0) & (items < self.item_count)
+        items, basket_ids, within_group_weights = items[valid], basket_ids[valid], within_group_weights[valid]
         
-        if not baskets:
-            return final_vector
+        # Per-basket group vector entries: an item repeated inside one basket is summed
+        # before the basket weight is applied, exactly like the per-basket loop did
+        basket_item_keys, inverse = np.unique(basket_ids * self.item_count + items, return_inverse=True)
+        group_values = np.bincount(inverse, weights=within_group_weights, minlength=len(basket_item_keys))
         
-        # Process each basket with temporal decay
-        for basket_idx, basket in enumerate(baskets):
-            if not basket:
-                continue
-                
-            # Temporal decay: more recent baskets get higher weight
-            basket_position = len(baskets) - basket_idx - 1  # 0 for most recent
-            basket_weight = (GROUP_DECAY_RATE ** basket_position)
-            
-            # Within-basket grouping
-            group_vector = np.zeros(self.item_count)
-            
-            # Group items in basket by GROUP_SIZE
-            for group_start in range(0, len(basket), GROUP_SIZE):
-                group = basket[group_start:group_start + GROUP_SIZE]
-                
-                # Within-group decay
-                for item_idx, item_id in enumerate(group):
-                    if 0 <= item_id < self.item_count:
-                        within_group_weight = (WITHIN_DECAY_RATE ** item_idx)
-                        group_vector[item_id] += within_group_weight
-            
-            # Add group vector to final vector
-            final_vector += group_vector * basket_weight
+        # Temporal decay: more recent baskets get higher weight (position 0 for most recent)
+        basket_position = n_baskets - 1 - basket_item_keys // self.item_count
+        basket_weight_table = np.array([params.group_decay ** position for position in range(n_baskets)])
+        basket_weights = basket_weight_table[basket_position]
         
-        return final_vector
+        # Single scatter-add into the output vector; keys are sorted by basket,
+        # so every item accumulates its baskets oldest first
+        return np.bincount(
+            basket_item_keys % self.item_count,
+            weights=group_values * basket_weights,
+            minlength=self.item_count
+        ).astype(np.float64, copy=False)
     
-    def _get_user_history_from_db(self, user_id: int) -> List[List[int]]:
+    @staticmethod
+    def _query_user_histories(cur, user_ids: List[int]) -> Dict[int, List]:
         """
-        Get user's order history from database
-        Format: [[user_id], [basket1], [basket2], ...]
+        Several users' order histories, read on an open cursor
+        Format: {user_id: [user_id, basket1, basket2, ...]}, users without orders are left out
         """
+        # Get users' orders in chronological order
+        cur.execute("""
+            SELECT o.user_id, o.id as order_id, o.created_at, 
+                   array_agg(oi.product_id ORDER BY oi.created_at, oi.add_to_cart_order) as products
+            FROM orders o
+            JOIN order_items oi ON o.id = oi.order_id
+            WHERE o.user_id = ANY(%s)
+            GROUP BY o.user_id, o.id, o.created_at
+            ORDER BY o.user_id, o.created_at
+        """, (list(user_ids),))
+        
+        # Format as expected by TIFUKNN: [user_id, basket1, basket2, ...]
+        histories = {}
+        for order in cur.fetchall():
+            history = histories.setdefault(order['user_id'], [order['user_id']])  # First element is user_id
+            if order['products']:
+                history.append([int(pid) for pid in order['products'] if pid])
+        
+        return histories
+    
+    def _get_user_vector_states(self, user_ids: List[int],
+                                params: Optional[TifuKnnParams] = None) -> Dict[int, Tuple[np.ndarray, int]]:
+        """
+        Get several users' TIFUKNN vectors from the user_vectors table
+        A stored state is used while it covers every order of the user and was built
+        with the same vector parameters; missing or stale states are recomputed from
+        the full history once and stored again
+        Format: {user_id: (user_vector, basket_count)}, users without orders are left out
+        """
+        params = params or self.params
+        states = {}
         try:
             conn = psycopg2.connect(**DATABASE_CONFIG)
             cur = conn.cursor(cursor_factory=RealDictCursor)
-            
-            # Get user's orders in chronological order
             cur.execute("""
-                SELECT o.id as order_id, o.created_at, 
-                       array_agg(oi.product_id ORDER BY oi.created_at) as products
-                FROM orders o
-                JOIN order_items oi ON o.id = oi.order_id
-                WHERE o.user_id = %s
-                GROUP BY o.id, o.created_at
-                ORDER BY o.created_at
-            """, (user_id,))
-            
-            orders = cur.fetchall()
+                SELECT uv.user_id, uv.item_ids, uv.weights, uv.basket_count
+                FROM user_vectors uv
+                WHERE uv.user_id = ANY(%s)
+                  AND uv.params_hash = %s
+                  AND uv.order_count = (SELECT COUNT(*) FROM orders o WHERE o.user_id = uv.user_id)
+            """, (list(user_ids), params.vector_hash))
+            for row in cur.fetchall():
+                states[row['user_id']] = (self._state_vector(row['item_ids'], row['weights']), row['basket_count'])
             cur.close()
             conn.close()
+        except Exception as e:
+            print(f"Database error getting user vector states: {e}")
+        
+        stale_user_ids = [user_id for user_id in user_ids if user_id not in states]
+        if stale_user_ids:
+            states.update(self._rebuild_user_vector_states(stale_user_ids, params))
+        return states
+    
+    def _rebuild_user_vector_states(self, user_ids: List[int],
+                                    params: Optional[TifuKnnParams] = None) -> Dict[int, Tuple[np.ndarray, int]]:
+        """
+        Recompute users' vector states with params (default: served ones) from their full order history and store them
+        History and order counts are read in one snapshot and orders are committed
+        together with their items, so a rebuilt state holds every order it counts.
+        It only replaces a stored state covering fewer orders (or built with other
+        parameters): one with as many orders may have been folded in meanwhile
+        """
+        try:
+            conn = psycopg2.connect(**DATABASE_CONFIG)
+            conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            histories = self._query_user_histories(cur, user_ids)
+            cur.execute("""
+                SELECT user_id, COUNT(*) as order_count
+                FROM orders
+                WHERE user_id = ANY(%s)
+                GROUP BY user_id
+            """, (list(user_ids),))
+            order_counts = {row['user_id']: row['order_count'] for row in cur.fetchall()}
+            conn.commit()
+            cur.close()
+            conn.close()
+        except Exception as e:
+            print(f"Database error getting user history: {e}")
+            return {}
+        
+        params = params or self.params
+        states = {}
+        for user_id, history in histories.items():
+            items, basket_sizes = self._flatten_history(history)
+            if len(basket_sizes):
+                user_vector = self._temporal_decay_sum_flat(items, basket_sizes, params)
+            else:
+                user_vector = np.zeros(self.item_count)
+            states[user_id] = (user_vector, len(basket_sizes))
+        
+        self._save_user_vector_states(
+            {user_id: state for user_id, state in states.items() if user_id in order_counts},
+            order_counts,
+            params.vector_hash
+        )
+        return states
+    
+    def _save_user_vector_states(self, states: Dict[int, Tuple[np.ndarray, int]], order_counts: Dict[int, int],
+                                 params_hash: str, cur=None):
+        """
+        Upsert vector states (non-zero entries only) built with the vector parameters of params_hash;
+        a state only replaces one with the same parameters covering fewer orders
+        """
+        if not states:
+            return
+        try:
+            conn = None
+            if cur is None:
+                conn = psycopg2.connect(**DATABASE_CONFIG)
+                cur = conn.cursor()
+            for user_id, (user_vector, basket_count) in states.items():
+                nonzero = np.flatnonzero(user_vector)
+                cur.execute("""
+                    INSERT INTO user_vectors (user_id, item_ids, weights, basket_count, order_count, params_hash, updated_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        item_ids = EXCLUDED.item_ids,
+                        weights = EXCLUDED.weights,
+                        basket_count = EXCLUDED.basket_count,
+                        order_count = EXCLUDED.order_count,
+                        params_hash = EXCLUDED.params_hash,
+                        updated_at = EXCLUDED.updated_at
+                    WHERE user_vectors.order_count < EXCLUDED.order_count
+                       OR user_vectors.params_hash IS DISTINCT FROM EXCLUDED.params_hash
+                """, [user_id, nonzero.tolist(), user_vector[nonzero].tolist(), basket_count, order_counts[user_id],
+                      params_hash])
+            if conn is not None:
+                conn.commit()
+                cur.close()
+                conn.close()
+        except Exception as e:
+            print(f"Database error saving user vector states: {e}")
+    
+    def _state_vector(self, item_ids: List[int], weights: List[float]) -> np.ndarray:
+        """Dense user vector from a stored sparse state"""
+        user_vector = np.zeros(self.item_count)
+        if item_ids:
+            user_vector[np.asarray(item_ids, dtype=np.int64)] = weights
+        return user_vector
+    
+    def update_user_vector_state(self, user_id: int, basket: List[int]):
+        """
+        Fold a just-placed order into the user's stored vector state
+        The TIFUKNN vector is a decayed sum over baskets, so the new basket is added as
+        state * group_decay + group vector of the basket, without re-reading the history.
+        Called by orders.create_order after the order and its items are committed.
+        """
+        params = self.params
+        try:
+            conn = psycopg2.connect(**DATABASE_CONFIG)
+            cur = conn.cursor(cursor_factory=RealDictCursor)
             
-            if not orders:
-                return []
-            
-            # Format as expected by TIFUKNN: [user_id, basket1, basket2, ...]
-            history = [user_id]  # First element is user_id
-            for order in orders:
-                if order['products']:
-                    history.append([int(pid) for pid in order['products'] if pid])
+            # Lock the state row so concurrent orders of the same user fold one after another
+            cur.execute("""
+                SELECT item_ids, weights, basket_count, order_count, params_hash
+                FROM user_vectors
+                WHERE user_id = %s
+                FOR UPDATE
+            """, [user_id])
+            state = cur.fetchone()
+            cur.execute("SELECT COUNT(*) as order_count FROM orders WHERE user_id = %s", [user_id])
+            order_count = cur.fetchone()['order_count']
             
-            return history
+            if state and state['order_count'] == order_count - 1 and state['params_hash'] == params.vector_hash:
+                # The state covers every earlier order: fold the new basket in
+                items = np.asarray(basket, dtype=np.int64)
+                user_vector = self._state_vector(state['item_ids'], state['weights']) * params.group_decay
+                basket_count = state['basket_count']
+                if len(items):
+                    user_vector += self._temporal_decay_sum_flat(items, np.array([len(items)]), params)
+                    basket_count += 1
+                self._save_user_vector_states({user_id: (user_vector, basket_count)}, {user_id: order_count},
+                                              params.vector_hash, cur)
+                conn.commit()
+            else:
+                # No state yet, orders were added elsewhere (demo import) or the
+                # parameters changed: rebuild from history
+                conn.rollback()
+                self._rebuild_user_vector_states([user_id], params)
             
+            cur.close()
+            conn.close()
         except Exception as e:
-            print(f"Database error getting user history: {e}")
-            return []
+            print(f"Error updating user vector state: {e}")
     
-    def _knn_search(self, query_vector: np.ndarray, k: int) -> Tuple[List[str], np.ndarray]:
+    def _knn_search(self, query_vector: np.ndarray, k: int,
+                    generation: Optional[VectorGeneration] = None) -> Tuple[List[str], np.ndarray]:
         """
-        Find k nearest neighbors for query vector
+        Find k nearest neighbors for query vector (in the served generation by default)
         """
-        
-        if not self.recommender_vectors:
+        generation = generation or self.generation
+        if not generation.searchable:
             return [], np.array([])
         
-        # Convert recommender vectors to matrix
-        user_ids = list(self.recommender_vectors.keys())
+        # Search the prebuilt index, no per-request matrix copy or refit
+        rows, distances = generation.knn_index.search(query_vector, k)
         
-        # Limit search space for performance (random sampling)
-        if len(user_ids) > MATRIX_NEIGHBOR_KNN_SEARCH_LIMIT:
-            sampled_ids = random.sample(user_ids, MATRIX_NEIGHBOR_KNN_SEARCH_LIMIT)
-        else:
-            sampled_ids = user_ids
-        
-        vectors_matrix = np.array([self.recommender_vectors[uid] for uid in sampled_ids])
-        
-        # Use sklearn NearestNeighbors for efficiency
-        k_actual = min(k, len(sampled_ids))
-        nbrs = NearestNeighbors(n_neighbors=k_actual, metric='cosine')
-        nbrs.fit(vectors_matrix)
-        
-        # Find neighbors
-        distances, indices = nbrs.kneighbors([query_vector])
-        
-        # Convert indices back to user IDs
-        neighbor_ids = [sampled_ids[idx] for idx in indices[0]]
+        # Convert store rows back to user IDs
+        neighbor_ids = [generation.store.user_ids[row] for row in rows[0]]
         
         return neighbor_ids, distances[0]
     
-    def _merge_histories(self, user_vector: np.ndarray, neighbor_ids: List[str], alpha: float) -> List[int]:
+    def _merge_histories(self, user_vector: np.ndarray, neighbor_ids: List[str], alpha: float, k: int = TOPK,
+                         generation: Optional[VectorGeneration] = None) -> List[int]:
         """
         Merge user's history with neighbors' histories
-        Implements merge_history logic for single user
+        Implements merge_history logic for single user, returns the ranked top k items
         """
-        # Start with user's own vector weighted by alpha
-        merged_vector = user_vector * alpha
+        store = (generation or self.generation).store
+        # One sparse product over [user row; neighbor rows]: alpha on the user's own vector,
+        # (1-alpha)/len(neighbors) on each neighbor, touching only the union of non-zero items
+        neighbor_rows = np.array(store.rows(neighbor_ids), dtype=np.int64).reshape(1, -1)
+        merged = self._merge_histories_batch(sparse.csr_matrix(user_vector.reshape(1, -1)), neighbor_rows, alpha,
+                                             store.matrix)
         
-        # Add neighbors' vectors weighted by (1-alpha)
-        neighbor_weight = (1 - alpha) / len(neighbor_ids)
-
-        for neighbor_id in neighbor_ids:
-            if neighbor_id in self.recommender_vectors:
-                merged_vector += self.recommender_vectors[neighbor_id] * neighbor_weight
+        # Ranked top k item list
+        return self._top_k_sparse_items(merged.indices, merged.data, k, self.item_count)
+    
+    @staticmethod
+    def _top_k_items(scores: np.ndarray, k: int, items: Optional[np.ndarray] = None) -> List[int]:
+        """
+        Partial top-k selection: argpartition finds the k-th best score, only the
+        items scoring at least that much are sorted (descending score, ties by
+        descending item id like the reversed full argsort)
+        
+        Args:
+            scores: scores to rank
+            k: number of items to return
+            items: item ids of the scores (sparse row), defaults to the score positions
+        """
+        if items is None:
+            items = np.arange(len(scores))
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        threshold = scores[np.argpartition(scores, len(scores) - k)[len(scores) - k]]
+        top = np.flatnonzero(scores >= threshold)
+        top = top[np.lexsort((-items[top], -scores[top]))][:k]
+        return items[top].tolist()
+    
+    @staticmethod
+    def _top_k_sparse_items(items: np.ndarray, scores: np.ndarray, k: int, item_count: int) -> List[int]:
+        """
+        Top-k selection over the non-zero entries of a sparse row;
+        when there are fewer than k of them the ranking is padded with
+        zero-score items, highest item id first
+        """
+        ranked = TifuKnnEngine._top_k_items(scores, k, items)
+        if len(ranked) < k:
+            # The k highest ids not already ranked are among the k + len(ranked) highest ids
+            candidates = np.arange(item_count - 1, max(item_count - 1 - k - len(ranked), -1), -1)
+            padding = candidates[~np.isin(candidates, ranked)][:k - len(ranked)]
+            ranked.extend(padding.tolist())
+        return ranked
+    
+    def _merge_histories_batch(self, user_vectors: sparse.csr_matrix, neighbor_rows: np.ndarray, alpha: float,
+                               neighbor_vectors: Optional[sparse.csr_matrix] = None) -> sparse.csr_matrix:
+        """
+        Merge several users' histories with their neighbors' in one sparse product
         
-        # Convert to item list
-        item_list_result = merged_vector.argsort()[::-1].tolist()
+        Args:
+            user_vectors: (n_users, item_count) user vectors
+            neighbor_rows: (n_users, k) recommender store rows of each user's neighbors
+            neighbor_vectors: matrix the neighbor rows point into, defaults to the
+                              served recommender store (the sweep passes its own vectors)
         
-        return item_list_result
+        Returns:
+            (n_users, item_count) merged vectors
+        """
+        n_users, k = neighbor_rows.shape
+        if neighbor_vectors is None:
+            neighbor_vectors = self.recommender_vectors.matrix
+        
+        # Gather only the neighbor rows that are actually used
+        used_rows, neighbor_columns = np.unique(neighbor_rows, return_inverse=True)
+        neighbor_columns = neighbor_columns.reshape(n_users, k)
+        blocks = sparse.vstack([user_vectors, neighbor_vectors[used_rows]], format='csr')
+        
+        # Row i of the weights: alpha on its own vector first, then (1-alpha)/k on each neighbor,
+        # so every item accumulates in the same order as the single-user merge
+        weights = sparse.csr_matrix(
+            (
+                np.column_stack([np.full(n_users, alpha), np.full((n_users, k), (1 - alpha) / k)]).ravel(),
+                np.column_stack([np.arange(n_users), n_users + neighbor_columns]).ravel(),
+                np.arange(0, n_users * (k + 1) + 1, k + 1)
+            ),
+            shape=(n_users, n_users + len(used_rows))
+        )
+        
+        return weights @ blocks
+    
+    @staticmethod
+    def _prediction_metadata(use_csv_data: bool, num_neighbors: int, user_vector_sum: float,
+                             params: TifuKnnParams) -> Dict:
+        return {
+            'algorithm': 'TIFU-KNN',
+            'data_source': 'csv' if use_csv_data else 'database',
+            'num_neighbors': num_neighbors,
+            'user_vector_sum': user_vector_sum,
+            'parameters': {
+                'k': params.k,
+                'alpha': params.alpha,
+                'within_decay': params.within_decay,
+                'group_decay': params.group_decay,
+                'group_size': params.group_size,
+                'topk': params.topk
+            },
+            'params_hash': params.vector_hash
+        }
     
-    def predict_basket(self, user_id: str, use_csv_data: bool = False) -> Dict:
+    def predict_basket(self, user_id: str, use_csv_data: bool = False, candidates: int = 0) -> Dict:
         """
         Generate basket prediction for a user
         
         Args:
             user_id: User ID
             use_csv_data: True for CSV-only (Demand #3), False for DB (Demand #1)
+            candidates: when > 0, also return the ranked top-N candidate list (for evaluation)
         """
+        # One generation for the whole request, even if another one is swapped in meanwhile
+        generation = self.generation
+        params = generation.params
         try:
             # Get user history based on data source
             if use_csv_data:
@@ -299,27 +875,31 @@ class TifuKnnEngine:
                         'error': 'user id is not exist in loaded user dataset, try other user ids',
                         'items': []
                     }
-                user_history = self.csv_data_history[user_id]
+                # Flat basket arrays straight from the columnar store
+                items, basket_sizes = self.csv_data_history.flat(user_id)
+                basket_count = len(basket_sizes)
             else:
-                # Demand #1: Database prediction
-                user_history = self._get_user_history_from_db(int(user_id))
-                if not user_history:
+                # Demand #1: Database prediction, from the incrementally maintained vector state
+                state = self._get_user_vector_states([int(user_id)], params).get(int(user_id))
+                if not state:
                     return {
                         'success': False,
                         'error': 'No order history found in database',
                         'items': []
                     }
+                user_vector, basket_count = state
             
             # Check minimum history requirement
-            if len(user_history) < 3:  # user_id + at least 2 baskets
+            if basket_count < 2:  # at least 2 baskets
                 return {
                     'success': False,
                     'error': 'Insufficient purchase history (minimum 2 orders required)',
                     'items': []
                 }
             
-            # Compute user vector
-            user_vector = self._compute_user_vector(user_history)
+            # Compute user vector (the database state already holds it)
+            if use_csv_data:
+                user_vector = self._compute_flat_user_vector(items, basket_sizes, params)
             if user_vector is None or np.sum(user_vector) == 0:
                 return {
                     'success': False,
@@ -328,33 +908,25 @@ class TifuKnnEngine:
                 }
             
             # Find nearest neighbors
-            neighbor_ids, distances = self._knn_search(user_vector, KNN_K)
+            neighbor_ids, distances = self._knn_search(user_vector, params.k, generation)
             
+            # Only the top ranks are ever selected, never a full sort of all items
+            ranking_size = max(params.topk, candidates)
             if not neighbor_ids:
                 # No neighbors found, use user's own history
-                top_items = user_vector.argsort()[::-1].tolist()[:TOPK]
+                ranked_items = self._top_k_items(user_vector, ranking_size)
             else:
                 # Merge histories
-                top_items = self._merge_histories(user_vector, neighbor_ids, ALPHA)[:TOPK]
+                ranked_items = self._merge_histories(user_vector, neighbor_ids, params.alpha, ranking_size, generation)
             
-            return {
+            result = {
                 'success': True,
-                'items': top_items,
-                'metadata': {
-                    'algorithm': 'TIFU-KNN',
-                    'data_source': 'csv' if use_csv_data else 'database',
-                    'num_neighbors': len(neighbor_ids),
-                    'user_vector_sum': float(np.sum(user_vector)),
-                    'parameters': {
-                        'k': KNN_K,
-                        'alpha': ALPHA,
-                        'within_decay': WITHIN_DECAY_RATE,
-                        'group_decay': GROUP_DECAY_RATE,
-                        'group_size': GROUP_SIZE,
-                        'topk': TOPK
-                    }
-                }
+                'items': ranked_items[:params.topk],
+                'metadata': self._prediction_metadata(use_csv_data, len(neighbor_ids), float(np.sum(user_vector)), params)
             }
+            if candidates > 0:
+                result['candidates'] = ranked_items[:candidates]
+            return result
             
         except Exception as e:
             print(f"Prediction error: {str(e)}")
@@ -363,6 +935,169 @@ class TifuKnnEngine:
                 'error': f'Prediction failed: {str(e)}',
                 'items': []
             }
+    
+    def predict_baskets(self, user_ids: List[str], use_csv_data: bool = False, candidates: int = 0) -> Dict[str, Dict]:
+        """
+        Generate basket predictions for many users at once
+        All query vectors are stacked into one matrix, searched with one batched
+        KNN query and merged with their neighbors in one sparse product.
+        
+        Args:
+            user_ids: User IDs
+            use_csv_data: True for CSV-only (Demand #3), False for DB (Demand #1)
+            candidates: when > 0, also return each user's ranked top-N candidate list
+        
+        Returns:
+            {user_id: result}, in input order, every result shaped like predict_basket's
+        """
+        results = {}
+        user_states = {}
+        # One generation for the whole batch, even if another one is swapped in meanwhile
+        generation = self.generation
+        params = generation.params
+        
+        try:
+            # Get user vectors based on data source, as (vector or flat history, basket count)
+            if use_csv_data:
+                for user_id in user_ids:
+                    if user_id in self.csv_data_history:
+                        items, basket_sizes = self.csv_data_history.flat(user_id)
+                        user_states[user_id] = ((items, basket_sizes), len(basket_sizes))
+                    else:
+                        results[user_id] = self._prediction_error('user id is not exist in loaded user dataset, try other user ids')
+            else:
+                db_user_ids = {}
+                for user_id in user_ids:
+                    try:
+                        db_user_ids[user_id] = int(user_id)
+                    except (TypeError, ValueError):
+                        results[user_id] = self._prediction_error('Invalid user ID')
+                db_states = self._get_user_vector_states(list(db_user_ids.values()), params)
+                for user_id, db_user_id in db_user_ids.items():
+                    if db_states.get(db_user_id):
+                        user_states[user_id] = db_states[db_user_id]
+                    else:
+                        results[user_id] = self._prediction_error('No order history found in database')
+            
+            # Compute user vectors
+            query_user_ids = []
+            query_rows = []
+            user_vector_sums = []
+            for user_id, (state, basket_count) in user_states.items():
+                if basket_count < 2:  # at least 2 baskets
+                    results[user_id] = self._prediction_error('Insufficient purchase history (minimum 2 orders required)')
+                    continue
+                user_vector = self._compute_flat_user_vector(*state, params) if use_csv_data else state
+                if user_vector is None or np.sum(user_vector) == 0:
+                    results[user_id] = self._prediction_error('Failed to compute user vector')
+                    continue
+                query_user_ids.append(user_id)
+                query_rows.append(sparse.csr_matrix(user_vector))
+                user_vector_sums.append(float(np.sum(user_vector)))
+            
+            if query_user_ids:
+                user_vectors = sparse.vstack(query_rows, format='csr')
+                
+                # One batched neighbor search and one merge for all users
+                if generation.searchable:
+                    neighbor_rows, _ = generation.knn_index.search(user_vectors, params.k)
+                    ranked_vectors = self._merge_histories_batch(user_vectors, neighbor_rows, params.alpha,
+                                                                 generation.store.matrix)
+                    num_neighbors = neighbor_rows.shape[1]
+                else:
+                    # No neighbors available, use users' own histories
+                    ranked_vectors = user_vectors
+                    num_neighbors = 0
+                
+                # Partial top-k selection straight on each sparse row
+                ranking_size = max(params.topk, candidates)
+                ranked_vectors = ranked_vectors.tocsr()
+                for i, user_id in enumerate(query_user_ids):
+                    start, end = ranked_vectors.indptr[i], ranked_vectors.indptr[i + 1]
+                    ranked_items = self._top_k_sparse_items(
+                        ranked_vectors.indices[start:end], ranked_vectors.data[start:end], ranking_size, self.item_count
+                    )
+                    results[user_id] = {
+                        'success': True,
+                        'items': ranked_items[:params.topk],
+                        'metadata': self._prediction_metadata(use_csv_data, num_neighbors, user_vector_sums[i], params)
+                    }
+                    if candidates > 0:
+                        results[user_id]['candidates'] = ranked_items[:candidates]
+            
+        except Exception as e:
+            print(f"Batch prediction error: {str(e)}")
+            for user_id in user_ids:
+                results.setdefault(user_id, self._prediction_error(f'Prediction failed: {str(e)}'))
+        
+        return {user_id: results[user_id] for user_id in user_ids}
+    
+    def ground_truth_basket(self, user_id) -> List[int]:
+        """
+        Future (held-out) basket of a dataset user in add to cart order, empty when unknown
+        """
+        items, _ = self.ground_truth.flat(user_id)
+        return items.tolist()
+
+    @staticmethod
+    def _prediction_error(error: str) -> Dict:
+        return {
+            'success': False,
+            'error': error,
+            'items': []
+        }
+
+class _PrecomputeProgress:
+    """Throughput (users/s) and ETA report for the vector pre-computation"""
+
+    REPORT_EVERY_SECONDS = 10
+
+    def __init__(self, total: int, callback: Optional[Callable[[int, int], None]] = None):
+        self.total = total
+        self.callback = callback
+        self.done = 0
+        self.started = time.perf_counter()
+        self.last_report = self.started
+
+    def update(self, processed: int):
+        self.done += processed
+        if self.callback:
+            self.callback(self.done, self.total)
+        now = time.perf_counter()
+        if now - self.last_report < self.REPORT_EVERY_SECONDS and self.done < self.total:
+            return
+        self.last_report = now
+        rate = self.done / max(now - self.started, 1e-9)
+        eta = (self.total - self.done) / rate if rate > 0 else 0
+        print(f"Progress: {self.done}/{self.total} users | {rate:.0f} users/s | ETA {_format_duration(eta)}")
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def elapsed_str(self) -> str:
+        return _format_duration(self.elapsed())
+
+
+def _process_rss_mb() -> Optional[float]:
+    """Resident memory of this process in MB (Linux /proc), None where unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return round(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20, 1)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+def _compute_vector_shard(user_ids: List[str], params: TifuKnnParams) -> Tuple[List[str], sparse.csr_matrix, int]:
+    """Process pool entry point, the forked worker got the engine from the pool initializer"""
+    engine, = worker_state()
+    return engine._compute_vector_shard(user_ids, params)
+
 
 # Singleton instance
 _engine_instance = None
@@ -380,4 +1115,4 @@ def get_engine() -> TifuKnnEngine:
     return _engine_instance
 
 # Export main class and function
-__all__ = ['TifuKnnEngine', 'get_engine']
\ No newline at end of file
+__all__ = ['TifuKnnEngine', 'TifuKnnParams', 'get_engine']
\ No newline at end of file
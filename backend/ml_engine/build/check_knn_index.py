@@ -0,0 +1,96 @@
+# backend/ml_engine/build/check_knn_index.py
+"""
+Regression check of the KNN index search cost
+A single-user search must only allocate O(store rows) - its distance row and
+the partial sort - never a copy of the store (e.g. a transposed CSR matrix,
+which costs the store's full size and seconds per query on large stores).
+Exits with status 1 when the peak allocation of one search exceeds the budget.
+Run by hand after changing the KNN index or the vector store, or upgrading scipy;
+not at backend startup, the budget depends on the scipy version.
+
+Usage:
+    python check_knn_index.py                 # persisted recommender vectors
+    python check_knn_index.py --rows 100000   # synthetic store of that many users
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+# Run from ml_engine/build like the other pipeline scripts, the engine lives two levels up
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from ml_engine import VECTORS_PATH
+from ml_engine.knn_index import KnnIndex
+from ml_engine.vector_store import RecommenderVectorStore
+
+SEARCH_BYTES_PER_ROW = 64 # Allowed peak allocation of one single-user search per store row
+SEARCH_BYTES_SLACK = 2**20
+SYNTHETIC_ITEMS = 50000
+SYNTHETIC_ITEMS_PER_USER = 200
+
+
+def synthetic_store(rows: int, seed: int = 0) -> RecommenderVectorStore:
+    """Random store with SYNTHETIC_ITEMS_PER_USER items per user, like the Instacart vectors"""
+    rng = np.random.default_rng(seed)
+    indices = np.sort(rng.integers(0, SYNTHETIC_ITEMS, size=(rows, SYNTHETIC_ITEMS_PER_USER)), axis=1)
+    matrix = sparse.csr_matrix(
+        (rng.random(rows * SYNTHETIC_ITEMS_PER_USER), indices.astype(np.int32).ravel(),
+         np.arange(rows + 1, dtype=np.int64) * SYNTHETIC_ITEMS_PER_USER),
+        shape=(rows, SYNTHETIC_ITEMS)
+    )
+    matrix.sum_duplicates()
+    return RecommenderVectorStore([str(row) for row in range(rows)], matrix)
+
+
+def measure_search(knn_index: KnnIndex, query, k: int):
+    """(peak bytes allocated, seconds) of one search"""
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        knn_index.search(query, k)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the memory cost of a KNN index search')
+    parser.add_argument('--rows', type=int, default=None, help='check a synthetic store of this many users instead')
+    parser.add_argument('--k', type=int, default=50, help='neighbors per search')
+    args = parser.parse_args()
+
+    vectors_dir = VECTORS_PATH / 'recommender_vectors'
+    if args.rows is not None:
+        store = synthetic_store(args.rows)
+    elif RecommenderVectorStore.exists(vectors_dir):
+        store = RecommenderVectorStore.open(vectors_dir)
+    else:
+        parser.error(f'No recommender vectors in {vectors_dir}, pass --rows for a synthetic store')
+    if len(store) == 0:
+        print("⚠️  Empty vector store, nothing to check")
+        return
+
+    knn_index = KnnIndex.build(store)
+    query = store.matrix[:1]
+    knn_index.search(query, args.k)  # Page the store in, the check measures a served search
+    peak, seconds = measure_search(knn_index, query, args.k)
+
+    budget = SEARCH_BYTES_PER_ROW * len(store) + SEARCH_BYTES_SLACK
+    print(f"🔎 Single-user search over {len(store)} vectors ({store.nbytes / 2**20:.1f} MB): "
+          f"{seconds * 1000:.1f} ms, peak allocation {peak / 2**20:.2f} MB (budget {budget / 2**20:.2f} MB)")
+    if peak > budget:
+        print("❌ KNN search allocates more than its distance row, it copies the vector store")
+        sys.exit(1)
+    print("✅ KNN search cost within budget")
+
+
+if __name__ == "__main__":
+    main()
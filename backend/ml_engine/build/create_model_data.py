@@ -5,18 +5,94 @@ Updated paths for new project structure
 """
 
 import pandas as pd
+import numpy as np
 import json
-from tqdm import tqdm
 import os
 
 # Updated data paths for new structure
 DATA_DIR = "/app/data/dataset"
 
+# Columnar basket store format, read by ml_engine/history_store.py
+BASKET_STORE_FORMAT = 'basket-store-v1'
+
+
+def write_basket_store(df, store_dir):
+    """
+    Write users' baskets as a columnar store:
+        items.npy (int32) + basket_offsets.npy + user_offsets.npy + user_ids.npy (sorted)
+    Baskets keep their order_number order and items keep their row (add to cart) order.
+    """
+    user_ids = df['user_id'].to_numpy(dtype=np.int64)
+    order_numbers = df['order_number'].to_numpy(dtype=np.int64)
+    
+    # Stable sort: by user, then by basket, preserving the in-basket row order
+    order = np.lexsort((order_numbers, user_ids))
+    user_ids = user_ids[order]
+    order_numbers = order_numbers[order]
+    items = df['product_id'].to_numpy(dtype=np.int32)[order]
+    
+    # A basket starts wherever the (user, order_number) pair changes
+    new_basket = np.ones(len(items), dtype=bool)
+    new_basket[1:] = (user_ids[1:] != user_ids[:-1]) | (order_numbers[1:] != order_numbers[:-1])
+    basket_starts = np.flatnonzero(new_basket)
+    basket_offsets = np.append(basket_starts, len(items)).astype(np.int64)
+    
+    # A user starts wherever the basket's user changes
+    basket_users = user_ids[basket_starts]
+    new_user = np.ones(len(basket_starts), dtype=bool)
+    new_user[1:] = basket_users[1:] != basket_users[:-1]
+    user_basket_starts = np.flatnonzero(new_user)
+    user_offsets = np.append(user_basket_starts, len(basket_starts)).astype(np.int64)
+    
+    os.makedirs(store_dir, exist_ok=True)
+    np.save(os.path.join(store_dir, 'items.npy'), items)
+    np.save(os.path.join(store_dir, 'basket_offsets.npy'), basket_offsets)
+    np.save(os.path.join(store_dir, 'user_offsets.npy'), user_offsets)
+    np.save(os.path.join(store_dir, 'user_ids.npy'), basket_users[user_basket_starts])
+    with open(os.path.join(store_dir, 'meta.json'), 'w') as f:
+        json.dump({
+            'format': BASKET_STORE_FORMAT,
+            'users': len(user_basket_starts),
+            'baskets': len(basket_starts),
+            'items': len(items)
+        }, f)
+    
+    return len(user_basket_starts)
+
+
+def create_history_store(history_df=None):
+    """
+    Write the users' basket histories read by TIFUKNN as the columnar store
+    data_history/, from instacart_history.csv unless the history split is passed in
+    """
+    if history_df is None:
+        history_df = pd.read_csv(os.path.join(DATA_DIR, 'instacart_history.csv'))
+    history_store_dir = os.path.join(DATA_DIR, 'data_history')
+    users_num = write_basket_store(history_df, history_store_dir)
+    print(f"✅ Created '{history_store_dir}'")
+    return users_num
+
+
+def create_ground_truth_store(future_df=None):
+    """
+    Write the ground-truth index (user id -> future basket) read by the engine
+    as a one-basket-per-user store in data_future/, from instacart_future.csv
+    unless the future split is passed in
+    """
+    if future_df is None:
+        future_df = pd.read_csv(os.path.join(DATA_DIR, 'instacart_future.csv'))
+    future_store_dir = os.path.join(DATA_DIR, 'data_future')
+    users_num = write_basket_store(future_df, future_store_dir)
+    print(f"✅ Created '{future_store_dir}' ({users_num} users with ground truth)")
+    return users_num
+
+
 def create_model_data():
     try:
         """
         Transform cleaned data into model format
-        Creates history/future splits and JSON format for TIFUKNN
+        Creates history/future splits, the columnar basket store for TIFUKNN
+        and the ground-truth index used by the evaluations
         """
         print("Creating model data from preprocessed dataset...")
         
@@ -47,26 +123,13 @@ def create_model_data():
         print(f"✅ Created '{history_path}'")
         print(f"✅ Created '{future_path}'")
         
-        print("\nCreating JSON history file for TIFUKNN model...")
-        # Create the data_history.json file needed by the ML engine
-        data_history = {}
-        
-        # Group by user, then iterate through each user's baskets in order
-        for user_id, user_df in tqdm(history_df.groupby('user_id'), desc="Processing users"):
-            # Sort baskets by order number to maintain sequence
-            user_baskets = user_df.sort_values('order_number').groupby('order_number')['product_id'].apply(list).tolist()
-            
-            # The first item in the list is a placeholder for the user_id itself,
-            # followed by the list of baskets.
-            data_history[str(user_id)] = [user_id] + user_baskets
-        
-        # Save the final JSON file
-        history_json_path = os.path.join(DATA_DIR, 'data_history.json')
-        with open(history_json_path, 'w') as f:
-            json.dump(data_history, f)
+        print("\nCreating columnar history store for TIFUKNN model...")
+        # Create the data_history store needed by the ML engine
+        users_num = create_history_store(history_df)
+        print(f"👥 Processed {users_num} users for ML model")
         
-        print(f"✅ Created '{history_json_path}'")
-        print(f"👥 Processed {len(data_history)} users for ML model")
+        print("\nCreating ground-truth index for evaluation...")
+        create_ground_truth_store(future_df)
         print("\n🎯 Model data creation complete!")
     
     except Exception as e:
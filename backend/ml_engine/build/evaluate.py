@@ -0,0 +1,49 @@
+# backend/ml_engine/build/evaluate.py
+"""
+Offline evaluation of the TIFUKNN engine on the val/test users
+Same metrics as /api/evaluations/metrics, computed by ml_engine/evaluation.py
+
+Usage:
+    python evaluate.py --sample-size -1 --workers 8 --output metrics.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Run from ml_engine/build like the other pipeline scripts, the engine lives two levels up
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from ml_engine import get_engine
+from ml_engine.evaluation import EVALUATION_BATCH_SIZE, METRIC_NAMES, evaluate
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate TIFUKNN on the val/test users')
+    parser.add_argument('--sample-size', type=int, default=-1, help='users to evaluate, -1 for all of them')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default EVALUATION_WORKERS)')
+    parser.add_argument('--batch-size', type=int, default=EVALUATION_BATCH_SIZE, help='users per batched prediction')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the user sampling')
+    parser.add_argument('--output', type=str, default=None, help='also write the results to this JSON file')
+    args = parser.parse_args()
+    if args.sample_size < 1 and args.sample_size != -1:
+        parser.error('--sample-size must be at least 1 or -1 for all users')
+
+    engine = get_engine()
+    print(f"📏 Evaluating {'all' if args.sample_size == -1 else args.sample_size} val/test users...")
+    results = evaluate(engine, args.sample_size, workers=args.workers, batch_size=args.batch_size, seed=args.seed)
+
+    print(f"✅ Evaluated {results['sampleSize']} users with {results['workers']} worker(s)")
+    for name in METRIC_NAMES:
+        print(f"   {name:<18} {results[name]:.4f}")
+    print("⏱️  Timings: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in results['timings'].items()))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📁 Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# backend/ml_engine/build/sweep.py
+"""
+Hyperparameter sweep of TIFUKNN (ml_engine/sweep.py)
+Parameters left out keep the engine's value, see ml_engine/TIFUKNN default params.xlsx
+
+Usage:
+    python sweep.py --group-decay 0.6,0.7,0.8 --alpha 0.7,0.8,0.9 --k 12,50,100 \
+                    --sample-size 2000 --output sweep.csv
+"""
+
+import argparse
+import csv
+import json
+import sys
+from pathlib import Path
+
+# Run from ml_engine/build like the other pipeline scripts, the engine lives two levels up
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from ml_engine import get_engine
+from ml_engine.evaluation import METRIC_NAMES
+from ml_engine.sweep import GRID_PARAMETERS, sweep
+
+TABLE_COLUMNS = list(GRID_PARAMETERS) + list(METRIC_NAMES) + ['seconds']
+
+
+def values(cast):
+    """argparse type of a comma separated list"""
+    return lambda text: [cast(value) for value in text.split(',') if value]
+
+
+def print_table(rows, metric):
+    """Configurations by decreasing metric, with their stand-alone wall-clock cost"""
+    rows = sorted(rows, key=lambda row: row[metric], reverse=True)
+    widths = [max(len(column), *(len(str(row[column])) for row in rows)) for column in TABLE_COLUMNS]
+    print("  ".join(column.ljust(width) for column, width in zip(TABLE_COLUMNS, widths)))
+    for row in rows:
+        print("  ".join(str(row[column]).ljust(width) for column, width in zip(TABLE_COLUMNS, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep TIFUKNN hyperparameters on the val/test users')
+    parser.add_argument('--within-decay', type=values(float), default=None, help='WITHIN_DECAY_RATE values')
+    parser.add_argument('--group-decay', type=values(float), default=None, help='GROUP_DECAY_RATE values')
+    parser.add_argument('--group-size', type=values(int), default=None, help='GROUP_SIZE values')
+    parser.add_argument('--alpha', type=values(float), default=None, help='ALPHA values')
+    parser.add_argument('--k', type=values(int), default=None, help='KNN_K values')
+    parser.add_argument('--sample-size', type=int, default=1000, help='evaluated users, -1 for all of them')
+    parser.add_argument('--max-recommenders', type=int, default=-1, help='limit on recommender users, -1 for all')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default SWEEP_WORKERS)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the user sampling')
+    parser.add_argument('--metric', choices=METRIC_NAMES, default='NDCGAt', help='metric the table is sorted by')
+    parser.add_argument('--output', type=str, default=None, help='also write the results (.csv or .json)')
+    args = parser.parse_args()
+
+    grid = {
+        'within_decay': args.within_decay,
+        'group_decay': args.group_decay,
+        'group_size': args.group_size,
+        'alpha': args.alpha,
+        'k': args.k
+    }
+    try:
+        summary = sweep(get_engine(), grid, sample_size=args.sample_size, workers=args.workers,
+                        max_recommenders=args.max_recommenders, seed=args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(f"✅ Swept {len(summary['results'])} configurations on {summary['sampleSize']} users "
+          f"({summary['recommenders']} recommenders, {summary['workers']} worker(s))")
+    print_table(summary['results'], args.metric)
+    print("⏱️  Timings: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in summary['timings'].items()))
+
+    if args.output:
+        if args.output.endswith('.csv'):
+            with open(args.output, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(summary['results'][0]))
+                writer.writeheader()
+                writer.writerows(summary['results'])
+        else:
+            with open(args.output, 'w') as f:
+                json.dump(summary, f, indent=2)
+        print(f"📁 Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# backend/ml_engine/evaluation.py
+"""
+Offline evaluation of the TIFUKNN engine on the val/test users
+
+Predictions are made EVALUATION_BATCH_SIZE users at a time by a pool of forked
+worker processes (batched predict_baskets calls over the CSV histories, in
+process when called from the threaded backend, see workers.py), and
+the metrics are array operations over padded user x K matrices of predicted
+and ground-truth items instead of a per-user Python loop.
+
+Metric definitions are the ones of /api/evaluations/metrics: both baskets are
+cut to L = min(|truth|, |predicted|) items for Precision/Recall/F1/Jaccard,
+NDCG scores the full predicted ranking against the cut ground truth with an
+ideal DCG over L positions.
+
+Used by the evaluations endpoint (in a background job) and by build/evaluate.py.
+"""
+
+import os
+import random
+import time
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .workers import worker_pool, worker_state
+
+EVALUATION_BATCH_SIZE = 256 # Users predicted per batched engine call (one pool task)
+EVALUATION_WORKERS = int(os.getenv("EVALUATION_WORKERS", os.cpu_count() or 1)) # Worker processes predicting batches
+
+METRIC_NAMES = ('PrecisionAt', 'RecallAt', 'F1ScoreAt', 'NDCGAt', 'JaccardSimilarity')
+PAD = -1 # Padding of the item matrices, never a product id
+
+
+def pad_rows(rows: List[List[int]], width: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ragged item lists as a (len(rows), width) int64 matrix padded with PAD,
+    plus the row lengths
+    """
+    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+    width = int(lengths.max(initial=0)) if width is None else width
+    matrix = np.full((len(rows), width), PAD, dtype=np.int64)
+    for i, row in enumerate(rows):
+        row = row[:width]
+        matrix[i, :len(row)] = row
+    return matrix, np.minimum(lengths, width)
+
+
+def _first_occurrences(matrix: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Mask of the cells holding the first occurrence of their item in their row (set semantics)"""
+    width = matrix.shape[1]
+    same = (matrix[:, :, None] == matrix[:, None, :]) & mask[:, None, :]
+    earlier = np.tril(np.ones((width, width), dtype=bool), k=-1)
+    return mask & ~(same & earlier).any(axis=2)
+
+
+def ranking_metrics(predicted: np.ndarray, predicted_lengths: np.ndarray,
+                    truth: np.ndarray, truth_lengths: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Per-user metrics of padded predicted rankings against padded ground-truth baskets
+
+    Returns:
+        {metric name: (users,) float array}
+    """
+    columns = np.arange(max(predicted.shape[1], truth.shape[1]))
+    cut = np.minimum(predicted_lengths, truth_lengths)  # L per user
+    predicted_mask = columns[:predicted.shape[1]] < predicted_lengths[:, None]
+    predicted_cut = _first_occurrences(predicted, columns[:predicted.shape[1]] < cut[:, None])
+    truth_cut = _first_occurrences(truth, columns[:truth.shape[1]] < cut[:, None])
+
+    # in_truth[u, j]: predicted item j of user u is in the user's cut ground-truth set
+    in_truth = ((predicted[:, :, None] == truth[:, None, :]) & truth_cut[:, None, :]).any(axis=2)
+    predicted_size = predicted_cut.sum(axis=1)
+    truth_size = truth_cut.sum(axis=1)
+    hits = (in_truth & predicted_cut).sum(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted_size > 0, hits / predicted_size, 0.0)
+        recall = np.where(truth_size > 0, hits / truth_size, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+        union = predicted_size + truth_size - hits
+        jaccard = np.where(union > 0, hits / union, 1.0)
+
+        discounts = 1.0 / np.log2(np.arange(predicted.shape[1]) + 2)
+        dcg = ((in_truth & predicted_mask) * discounts).sum(axis=1)
+        ideal_discounts = np.concatenate([[0.0], np.cumsum(1.0 / np.log2(np.arange(len(columns)) + 2))])
+        idcg = ideal_discounts[cut]
+        ndcg = np.where(idcg > 0, dcg / idcg, 0.0)
+
+    return {
+        'PrecisionAt': precision,
+        'RecallAt': recall,
+        'F1ScoreAt': f1,
+        'NDCGAt': ndcg,
+        'JaccardSimilarity': jaccard
+    }
+
+
+def evaluation_users(engine, seed: Optional[int] = None) -> List[str]:
+    """Val and test users that have a ground-truth basket, in random order"""
+    users = [str(uid) for uid in engine.keyset.get('test', []) + engine.keyset.get('val', [])]
+    users = [user_id for user_id in users if user_id in engine.ground_truth]
+    random.Random(seed).shuffle(users)
+    return users
+
+
+def _predict_batch(engine, user_ids: List[str]) -> Tuple[List[str], List[List[int]]]:
+    """Predict one batch, returns the users predicted successfully and their items"""
+    results = engine.predict_baskets(user_ids, use_csv_data=True)
+    predicted_user_ids = [user_id for user_id in user_ids if results[user_id]['success']]
+    return predicted_user_ids, [results[user_id]['items'] for user_id in predicted_user_ids]
+
+
+def _predict_batch_in_worker(user_ids: List[str]) -> Tuple[List[str], List[List[int]]]:
+    """Process pool entry point, the worker got the engine from the pool initializer"""
+    engine, = worker_state()
+    return _predict_batch(engine, user_ids)
+
+
+def evaluate(engine, sample_size: int = -1, workers: Optional[int] = None,
+             batch_size: int = EVALUATION_BATCH_SIZE, seed: Optional[int] = None,
+             progress: Optional[Callable[[int, int], None]] = None,
+             cancelled: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Evaluate sample_size random val/test users (-1 for all of them)
+    Users whose prediction fails are replaced by further users, like the
+    endpoint always did, until sample_size users are scored or none are left.
+
+    Args:
+        workers: worker processes, defaults to EVALUATION_WORKERS
+        progress: called with (users predicted, sample size) after every batch
+        cancelled: polled between batches, stops the evaluation with the users scored so far
+
+    Returns:
+        averaged metrics (endpoint keys), sampleSize and per-phase timings in seconds
+    """
+    workers = max(1, workers or EVALUATION_WORKERS)
+    timings = {}
+    started = time.perf_counter()
+
+    users = evaluation_users(engine, seed)
+    sample_size = len(users) if sample_size == -1 else min(sample_size, len(users))
+    timings['selectUsers'] = time.perf_counter() - started
+
+    # Predict in rounds: a round asks for the users still missing, failures are topped up by the next one
+    phase_started = time.perf_counter()
+    predicted_user_ids = []
+    predicted_items = []
+    pool = worker_pool(workers, (engine,)) if sample_size > batch_size else None
+    if pool is None:
+        workers = 1
+    try:
+        while len(predicted_user_ids) < sample_size and users and not (cancelled and cancelled()):
+            round_users = users[:sample_size - len(predicted_user_ids)]
+            del users[:len(round_users)]
+            batches = [round_users[i:i + batch_size] for i in range(0, len(round_users), batch_size)]
+            if pool:
+                batch_results = pool.map(_predict_batch_in_worker, batches)
+            else:
+                batch_results = map(partial(_predict_batch, engine), batches)
+            for batch_user_ids, batch_items in batch_results:
+                predicted_user_ids.extend(batch_user_ids)
+                predicted_items.extend(batch_items)
+                if progress:
+                    progress(len(predicted_user_ids), sample_size)
+                if cancelled and cancelled():
+                    break
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    predicted_user_ids = predicted_user_ids[:sample_size]
+    predicted_items = predicted_items[:sample_size]
+    timings['predict'] = time.perf_counter() - phase_started
+
+    phase_started = time.perf_counter()
+    truth_items = [engine.ground_truth_basket(user_id) for user_id in predicted_user_ids]
+    timings['groundTruth'] = time.perf_counter() - phase_started
+
+    phase_started = time.perf_counter()
+    predicted, predicted_lengths = pad_rows(predicted_items)
+    truth, truth_lengths = pad_rows(truth_items, width=predicted.shape[1])  # only the first L <= K items count
+    per_user = ranking_metrics(predicted, predicted_lengths, truth, truth_lengths)
+    metrics = {name: round(float(np.mean(per_user[name])), 4) if len(predicted_user_ids) else 0.0
+               for name in METRIC_NAMES}
+    timings['metrics'] = time.perf_counter() - phase_started
+    timings['total'] = time.perf_counter() - started
+
+    return {
+        **metrics,
+        'sampleSize': len(predicted_user_ids),
+        'workers': workers,
+        'timings': {phase: round(seconds, 3) for phase, seconds in timings.items()}
+    }
+
+
+__all__ = ['evaluate', 'ranking_metrics', 'pad_rows', 'evaluation_users']
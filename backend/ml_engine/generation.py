@@ -0,0 +1,78 @@
+# backend/ml_engine/generation.py
+"""
+Vector generations: what the engine serves, and swaps as a whole
+
+A generation bundles a parameter set, the recommender vectors built with it and
+the KNN index over those vectors, and is never modified once built. A new
+configuration (or freshly pre-computed vectors) becomes a new generation that is
+warmed while the current one keeps serving, then made current with a single
+reference assignment (TifuKnnEngine.activate). Predictions read
+engine.generation once, so every request is served by exactly one generation,
+also while a swap happens.
+"""
+
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from .knn_index import KnnIndex
+from .params import TifuKnnParams
+from .vector_store import RecommenderVectorStore
+
+
+class VectorGeneration:
+    """Parameters + recommender vectors + KNN index served together"""
+
+    def __init__(self, params: TifuKnnParams, store: RecommenderVectorStore,
+                 knn_index: Optional[KnnIndex] = None, source: str = 'disk', version: Optional[int] = None):
+        self.params = params
+        self.store = store
+        self.knn_index = knn_index
+        self.source = source  # 'disk', 'precompute', 'reload', 'reconfigure' or 'empty'
+        self.version = version  # RecommenderVectorStore.version of the files it was opened from
+        self.created_at = time.time()
+        self.warmed = False
+
+    @property
+    def searchable(self) -> bool:
+        return self.knn_index is not None and len(self.knn_index) > 0
+
+    def with_params(self, params: TifuKnnParams) -> 'VectorGeneration':
+        """
+        Generation sharing these vectors and index under new query-time
+        parameters (alpha, k, topk); the vector parameters must be the same
+        """
+        if params.vector_hash != self.params.vector_hash:
+            raise ValueError('Vector parameters differ, the vectors have to be rebuilt')
+        generation = VectorGeneration(params, self.store, self.knn_index, source='reconfigure', version=self.version)
+        generation.warmed = self.warmed
+        return generation
+
+    def warm(self):
+        """
+        Page the memory-mapped arrays in and run one search, so the first
+        requests after the swap do not pay for the disk reads
+        """
+        if self.searchable:
+            matrix = self.store.matrix
+            for array in (matrix.data, matrix.indices, matrix.indptr, self.knn_index.inverse_norms):
+                np.add.reduce(array, dtype=np.float64)
+            self.knn_index.search(matrix[:1], 1)
+        self.warmed = True
+
+    def to_dict(self) -> Dict:
+        return {
+            'params': self.params.to_dict(),
+            'vectors': len(self.store),
+            'itemCount': self.store.item_count,
+            'sizeMB': round(self.store.nbytes / 2**20, 1),
+            'stamp': self.store.stamp,
+            'source': self.source,
+            'warmed': self.warmed,
+            'version': self.version,
+            'createdAt': self.created_at
+        }
+
+
+__all__ = ['VectorGeneration']
@@ -0,0 +1,104 @@
+# backend/ml_engine/history_store.py
+"""
+Columnar user basket store (written by build/create_model_data.py)
+Replaces data_history.json: one flat int32 item array plus basket and user offsets
+
+Layout of a store directory:
+    items.npy           int32  all item ids, user by user, basket by basket
+    basket_offsets.npy  int64  basket b spans items[basket_offsets[b]:basket_offsets[b + 1]]
+    user_offsets.npy    int64  user u owns baskets user_offsets[u]:user_offsets[u + 1]
+    user_ids.npy        int64  sorted user ids, row u belongs to user_ids[u]
+    meta.json           format tag and sizes
+
+Arrays are memory mapped, a user's history is only materialized when asked for.
+"""
+
+import json
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+STORE_FORMAT = 'basket-store-v1'
+STORE_ARRAYS = ('items', 'basket_offsets', 'user_offsets', 'user_ids')
+META_FILE = 'meta.json'
+
+
+class UserHistoryStore:
+    """
+    Read-only access to users' basket sequences.
+    Supports `user_id in store`, `len(store)` and `store[user_id]`
+    (the TIFUKNN list format [user_id, basket1, basket2, ...]).
+    """
+
+    def __init__(self, items: np.ndarray, basket_offsets: np.ndarray,
+                 user_offsets: np.ndarray, user_ids: np.ndarray):
+        self.items = items
+        self.basket_offsets = basket_offsets
+        self.user_offsets = user_offsets
+        self.user_ids = user_ids
+
+    @classmethod
+    def open(cls, directory: Path, mmap: bool = True) -> 'UserHistoryStore':
+        directory = Path(directory)
+        with open(directory / META_FILE, 'r') as f:
+            meta = json.load(f)
+        if meta.get('format') != STORE_FORMAT:
+            raise ValueError(f"Unsupported basket store format {meta.get('format')!r} in {directory}")
+        mmap_mode = 'r' if mmap else None
+        return cls(*(np.load(directory / f'{name}.npy', mmap_mode=mmap_mode) for name in STORE_ARRAYS))
+
+    def _row(self, user_id: Union[str, int]) -> Optional[int]:
+        """Row of the user in the store, None when unknown"""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        row = int(np.searchsorted(self.user_ids, user_id))
+        if row < len(self.user_ids) and self.user_ids[row] == user_id:
+            return row
+        return None
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def __contains__(self, user_id: Union[str, int]) -> bool:
+        return self._row(user_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(user_id) for user_id in self.user_ids)
+
+    def basket_count(self, user_id: Union[str, int]) -> int:
+        row = self._row(user_id)
+        if row is None:
+            return 0
+        return int(self.user_offsets[row + 1] - self.user_offsets[row])
+
+    def flat(self, user_id: Union[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The user's baskets as (items, basket_sizes), oldest basket first,
+        without building Python lists
+        """
+        row = self._row(user_id)
+        if row is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        offsets = self.basket_offsets[self.user_offsets[row]:self.user_offsets[row + 1] + 1]
+        return self.items[offsets[0]:offsets[-1]], np.diff(offsets)
+
+    def baskets(self, user_id: Union[str, int]) -> List[List[int]]:
+        """The user's baskets as lists of item ids, oldest basket first"""
+        items, basket_sizes = self.flat(user_id)
+        if len(basket_sizes) == 0:
+            return []
+        return [basket.tolist() for basket in np.split(np.asarray(items), np.cumsum(basket_sizes)[:-1])]
+
+    def __getitem__(self, user_id: Union[str, int]) -> List:
+        if user_id not in self:
+            raise KeyError(user_id)
+        return [int(user_id)] + self.baskets(user_id)
+
+    def get(self, user_id: Union[str, int], default=None):
+        return self[user_id] if user_id in self else default
+
+
+__all__ = ['UserHistoryStore']
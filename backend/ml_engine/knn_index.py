@@ -0,0 +1,138 @@
+# backend/ml_engine/knn_index.py
+"""
+Prebuilt cosine KNN index over the recommender vector store
+Built once (startup or precompute) and persisted inside the store directory,
+stamped with the identity of the store it was built over
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from .vector_store import RecommenderVectorStore
+
+INDEX_FILE = 'knn_inverse_norms.npy'
+INDEX_META_FILE = 'knn_index.json'
+SEARCH_BLOCK_SIZE = 64 # Queries scored at a time, bounds the dense (queries x store rows) distance block
+
+
+class KnnIndex:
+    """
+    Exact brute-force cosine neighbor search.
+    The index keeps the inverse L2 norm of every store row, computed once when
+    it is built, and searches the store's own CSR matrix (memory mapped or not),
+    so a query is a single sparse matrix product plus a partial sort - nothing is
+    copied or refitted per request, and results are deterministic
+    (ties are broken by store row). Queries are scored SEARCH_BLOCK_SIZE at a
+    time, so a large batch never holds more than one block of distances.
+    """
+
+    def __init__(self, matrix: sparse.csr_matrix, inverse_norms: np.ndarray, stamp: Optional[Dict] = None):
+        self.matrix = matrix
+        self.inverse_norms = inverse_norms
+        self.stamp = stamp  # store_identity() of the store it was built over, None when unknown
+
+    @classmethod
+    def build(cls, store: RecommenderVectorStore) -> 'KnnIndex':
+        norms = np.sqrt(np.asarray(store.matrix.multiply(store.matrix).sum(axis=1)).ravel())
+        inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+        return cls(store.matrix, inverse_norms, cls.store_identity(store))
+
+    @staticmethod
+    def store_identity(store: RecommenderVectorStore) -> Dict:
+        """Shape, nnz and parameter hash of a store, what an index built over it is stamped with"""
+        return {
+            'shape': [int(size) for size in store.matrix.shape],
+            'nnz': int(store.matrix.nnz),
+            'paramsHash': store.stamp['paramsHash'] if store.stamp else None
+        }
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def matches(self, store: RecommenderVectorStore) -> bool:
+        """
+        Whether this index was built over the given store. An index without a
+        stamp (written before stamping) never matches and gets rebuilt
+        """
+        return (self.stamp is not None and self.stamp == self.store_identity(store)
+                and self.inverse_norms.shape[0] == store.matrix.shape[0])
+
+    def search(self, query_vectors, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest store rows for every query vector
+
+        Args:
+            query_vectors: dense (item_count,) / (n, item_count) array or sparse (n, item_count) matrix
+            k: number of neighbors
+
+        Returns:
+            (rows, distances), both (n, k), ordered by increasing cosine distance
+        """
+        if sparse.issparse(query_vectors):
+            queries = sparse.csr_matrix(query_vectors)
+        else:
+            queries = sparse.csr_matrix(np.atleast_2d(query_vectors))
+        queries = normalize(queries, norm='l2', axis=1, copy=True)
+
+        k_actual = min(k, len(self))
+        rows = np.empty((queries.shape[0], k_actual), dtype=np.int64)
+        row_distances = np.empty((queries.shape[0], k_actual), dtype=np.float64)
+        for start in range(0, queries.shape[0], SEARCH_BLOCK_SIZE):
+            end = min(start + SEARCH_BLOCK_SIZE, queries.shape[0])
+            rows[start:end], row_distances[start:end] = self._search_block(queries[start:end], k_actual)
+        return rows, row_distances
+
+    def _search_block(self, queries: sparse.csr_matrix, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest rows of a block of normalized queries, the only dense (block x rows) array is reused in place"""
+        # store @ queries.T walks the CSR store as it is (memory mapped pages stay shared);
+        # queries @ store.T would transpose, i.e. copy, the whole store on every call
+        distances = (self.matrix @ queries.T).T.toarray()
+        distances *= self.inverse_norms[np.newaxis, :]
+        np.subtract(1.0, distances, out=distances)
+        np.clip(distances, 0.0, 2.0, out=distances)
+
+        if k < len(self):
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(len(self)), (distances.shape[0], 1))
+
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        rows = np.empty_like(candidates)
+        for i in range(candidates.shape[0]):
+            order = np.lexsort((candidates[i], candidate_distances[i]))
+            rows[i] = candidates[i, order]
+        return rows, np.take_along_axis(distances, rows, axis=1)
+
+    def save(self, directory: Path):
+        """Write the index files under temporary names and rename them into place, the norms last"""
+        directory = Path(directory)
+        suffix = f'.tmp-{os.getpid()}'
+        with open(directory / (INDEX_META_FILE + suffix), 'w') as f:
+            json.dump(self.stamp, f)
+        with open(directory / (INDEX_FILE + suffix), 'wb') as f:
+            np.save(f, self.inverse_norms)
+        os.replace(directory / (INDEX_META_FILE + suffix), directory / INDEX_META_FILE)
+        os.replace(directory / (INDEX_FILE + suffix), directory / INDEX_FILE)
+
+    @classmethod
+    def load(cls, directory: Path, store: RecommenderVectorStore, mmap: bool = True) -> 'KnnIndex':
+        inverse_norms = np.load(Path(directory) / INDEX_FILE, mmap_mode='r' if mmap else None)
+        try:
+            with open(Path(directory) / INDEX_META_FILE, 'r') as f:
+                stamp = json.load(f)
+        except FileNotFoundError:
+            stamp = None
+        return cls(store.matrix, inverse_norms, stamp)
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (Path(directory) / INDEX_FILE).exists()
+
+
+__all__ = ['KnnIndex']
@@ -0,0 +1,99 @@
+# backend/ml_engine/params.py
+"""
+TIFUKNN parameters of one engine configuration
+
+The vector parameters (within decay, group decay, group size) decide the
+recommender vectors and the users' stored vector states, so a persisted vector
+store is stamped with their hash (plus the item count) and only served by an
+engine configured with the same ones. alpha, k and topk are applied at query
+time and can change without touching the vectors.
+"""
+
+import hashlib
+import json
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Dict, Optional
+
+VECTOR_PARAMETERS = ('within_decay', 'group_decay', 'group_size')
+
+
+@dataclass(frozen=True)
+class TifuKnnParams:
+    """
+    Explicit TIFUKNN configuration, immutable so one object can be shared by
+    every request served with it. Vector defaults are the paper's values.
+    """
+
+    k: int
+    topk: int
+    within_decay: float = 0.9
+    group_decay: float = 0.7
+    group_size: int = 3
+    alpha: float = 0.9
+
+    def __post_init__(self):
+        if not 0 < self.within_decay <= 1 or not 0 < self.group_decay <= 1:
+            raise ValueError('within_decay and group_decay must be in (0, 1]')
+        if self.group_size < 1:
+            raise ValueError('group_size must be at least 1')
+        if not 0 <= self.alpha <= 1:
+            raise ValueError('alpha must be in [0, 1]')
+        if self.k < 1 or self.topk < 1:
+            raise ValueError('k and topk must be at least 1')
+
+    def vector_params(self) -> Dict:
+        return {name: getattr(self, name) for name in VECTOR_PARAMETERS}
+
+    @property
+    def vector_hash(self) -> str:
+        """Hash of the vector parameters, stamped on the stores built with them"""
+        return vector_params_hash(self.vector_params())
+
+    def stamp(self, item_count: int) -> Dict:
+        """Stamp of a vector store built with these parameters over item_count items"""
+        return {'paramsHash': self.vector_hash, 'params': self.vector_params(), 'itemCount': int(item_count)}
+
+    def with_vector_params(self, vector_params: Dict) -> 'TifuKnnParams':
+        """Same query-time parameters, vector parameters of a stamp"""
+        return replace(self, **{name: vector_params[name] for name in VECTOR_PARAMETERS})
+
+    def update(self, changes: Dict) -> 'TifuKnnParams':
+        """
+        Copy with some parameters changed, values cast from JSON
+        Raises ValueError on unknown parameters or invalid values
+        """
+        types = {field.name: field.type for field in fields(self)}
+        unknown = set(changes) - set(types)
+        if unknown:
+            raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+        cast = {}
+        for name, value in changes.items():
+            try:
+                cast[name] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{name} must be a number')
+            if types[name] is int:
+                if not cast[name].is_integer():
+                    raise ValueError(f'{name} must be an integer')
+                cast[name] = int(cast[name])
+        return replace(self, **cast)
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), 'vectorHash': self.vector_hash}
+
+
+def vector_params_hash(vector_params: Dict) -> str:
+    canonical = json.dumps({name: vector_params[name] for name in VECTOR_PARAMETERS}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+# Stores written before stamping were always built with the paper's vector parameters
+LEGACY_VECTOR_PARAMS = {field.name: field.default for field in fields(TifuKnnParams) if field.name in VECTOR_PARAMETERS}
+
+
+def stamp_vector_params(stamp: Optional[Dict]) -> Dict:
+    """Vector parameters a store was built with, from its stamp (None for legacy stores)"""
+    return dict(stamp['params']) if stamp else dict(LEGACY_VECTOR_PARAMS)
+
+
+__all__ = ['TifuKnnParams', 'VECTOR_PARAMETERS', 'vector_params_hash', 'stamp_vector_params']
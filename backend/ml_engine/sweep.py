@@ -0,0 +1,258 @@
+# backend/ml_engine/sweep.py
+"""
+Hyperparameter sweep of TIFUKNN over a grid of
+WITHIN_DECAY_RATE x GROUP_DECAY_RATE x GROUP_SIZE x ALPHA x KNN_K
+
+What is shared instead of recomputed per configuration:
+    - BasketStructure: the users' flattened histories with their (basket, item)
+      groups and (user, item) cells, built once for the recommender and the
+      evaluated users. A configuration's vectors are then a few array passes
+      (same accumulation order as _temporal_decay_sum_flat, so identical vectors).
+    - Vector configurations: (within decay, group decay, group size) decide the
+      vectors, so the recommender vectors and one neighbor search at the largest
+      k are computed once per vector configuration; every (alpha, k) pair reuses
+      them (neighbors for a smaller k are the prefix of the largest search, exact
+      up to ties at the k-th distance).
+Vector configurations are spread over SWEEP_WORKERS forked worker processes.
+
+Used by build/sweep.py
+"""
+
+import itertools
+import os
+import time
+from concurrent.futures import as_completed
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from scipy import sparse
+
+from . import DEFAULT_PARAMS, TifuKnnEngine
+from .evaluation import METRIC_NAMES, evaluation_users, pad_rows, ranking_metrics
+from .knn_index import KnnIndex
+from .params import VECTOR_PARAMETERS, TifuKnnParams
+from .vector_store import RecommenderVectorStore
+from .workers import worker_pool, worker_state
+
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", os.cpu_count() or 1)) # Worker processes, one vector configuration each
+
+GRID_PARAMETERS = ('within_decay', 'group_decay', 'group_size', 'alpha', 'k')
+DEFAULT_GRID = {name: [getattr(DEFAULT_PARAMS, name)] for name in GRID_PARAMETERS}
+
+
+class BasketStructure:
+    """
+    Configuration independent part of the TIFUKNN vectors of many users:
+    every item occurrence with its position in its basket, the (basket, item)
+    groups it sums into and the (user, item) cells the groups sum into
+    """
+
+    def __init__(self, history_store, user_ids: Sequence[str], item_count: int):
+        self.user_ids = list(user_ids)
+        self.item_count = item_count
+        flats = [history_store.flat(user_id) for user_id in self.user_ids]
+        user_basket_counts = np.array([len(basket_sizes) for _, basket_sizes in flats], dtype=np.int64)
+        basket_sizes = np.concatenate([np.empty(0, dtype=np.int64)] + [basket_sizes for _, basket_sizes in flats])
+        items = np.concatenate([np.empty(0, dtype=np.int64)] + [np.asarray(items, dtype=np.int64) for items, _ in flats])
+
+        # Occurrences: global basket id and position inside the basket
+        basket_ids = np.repeat(np.arange(len(basket_sizes)), basket_sizes)
+        basket_starts = np.cumsum(basket_sizes) - basket_sizes
+        position_in_basket = np.arange(len(items)) - np.repeat(basket_starts, basket_sizes)
+
+        # Baskets: owning row and recency (0 for the user's most recent basket)
+        basket_rows = np.repeat(np.arange(len(self.user_ids)), user_basket_counts)
+        user_basket_starts = np.cumsum(user_basket_counts) - user_basket_counts
+        basket_recency = (np.repeat(user_basket_counts, user_basket_counts) - 1
+                          - (np.arange(len(basket_sizes)) - np.repeat(user_basket_starts, user_basket_counts)))
+
+        valid = (items >= 0) & (items < item_count)
+        items, basket_ids, self.position_in_basket = items[valid], basket_ids[valid], position_in_basket[valid]
+
+        # Groups: (basket, item) pairs, sorted by basket then item like the per-user computation
+        group_keys, self.group_of_occurrence = np.unique(basket_ids * item_count + items, return_inverse=True)
+        self.group_of_occurrence = self.group_of_occurrence.ravel()
+        group_baskets = group_keys // item_count
+        self.group_recency = basket_recency[group_baskets]
+        self.group_count = len(group_keys)
+
+        # Cells: (row, item) pairs, each summing its groups oldest basket first
+        cell_keys = basket_rows[group_baskets] * item_count + group_keys % item_count
+        self.group_order = np.argsort(cell_keys, kind='stable')
+        cell_keys = cell_keys[self.group_order]
+        new_cell = np.ones(len(cell_keys), dtype=bool)
+        new_cell[1:] = cell_keys[1:] != cell_keys[:-1]
+        self.cell_of_group = np.cumsum(new_cell) - 1
+        cell_starts = np.flatnonzero(new_cell)
+        self.cell_items = cell_keys[cell_starts] % item_count
+        self.indptr = np.searchsorted(cell_keys[cell_starts] // item_count, np.arange(len(self.user_ids) + 1))
+
+    def vectors(self, within_decay: float, group_decay: float, group_size: int) -> sparse.csr_matrix:
+        """(users, item_count) TIFUKNN vectors of every user for one vector configuration"""
+        # Decay powers from Python's pow, like the engine, so the vectors are bit-identical
+        within_table = np.array([within_decay ** item_idx for item_idx in range(group_size)])
+        group_values = np.bincount(self.group_of_occurrence,
+                                   weights=within_table[self.position_in_basket % group_size],
+                                   minlength=self.group_count)
+        max_recency = int(self.group_recency.max(initial=0))
+        basket_table = np.array([group_decay ** position for position in range(max_recency + 1)])
+        weighted = (group_values * basket_table[self.group_recency])[self.group_order]
+        # bincount accumulates sequentially (np.add.reduceat sums long runs pairwise)
+        data = np.bincount(self.cell_of_group, weights=weighted, minlength=len(self.cell_items))
+        return sparse.csr_matrix((data, self.cell_items, self.indptr), shape=(len(self.user_ids), self.item_count))
+
+
+def parameter_grid(grid: Dict[str, Sequence], params: Optional[TifuKnnParams] = None) -> List[Dict]:
+    """
+    Every configuration of the grid, grouped by vector configuration; missing parameters come from params
+    Raises ValueError on unknown parameters or values TifuKnnParams rejects
+    """
+    unknown = set(grid) - set(GRID_PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown grid parameters: {', '.join(sorted(unknown))}")
+    params = params or DEFAULT_PARAMS
+    base = {name: [getattr(params, name)] for name in GRID_PARAMETERS}
+    grid = {**base, **{name: list(values) for name, values in grid.items() if values}}
+    configs = []
+    for values in itertools.product(*(grid[name] for name in GRID_PARAMETERS)):
+        checked = params.update(dict(zip(GRID_PARAMETERS, values)))
+        configs.append({name: getattr(checked, name) for name in GRID_PARAMETERS})
+    return configs
+
+
+def _sweep_vector_config(state: Dict, vector_config: Dict, configs: List[Dict]) -> List[Dict]:
+    """One vector configuration and all its (alpha, k) pairs"""
+    engine = state['engine']
+    shared = {}
+
+    started = time.perf_counter()
+    recommender_vectors = state['recommenders'].vectors(**vector_config)
+    keep = np.diff(recommender_vectors.indptr) > 0  # precompute drops empty vectors
+    store = RecommenderVectorStore([user_id for user_id, kept in zip(state['recommenders'].user_ids, keep) if kept],
+                                   recommender_vectors[keep])
+    query_vectors = state['queries'].vectors(**vector_config)
+    shared['vectorSeconds'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    knn_index = KnnIndex.build(store)
+    max_k = max(config['k'] for config in configs)
+    neighbor_rows, _ = knn_index.search(query_vectors, max_k)
+    shared['searchSeconds'] = time.perf_counter() - started
+
+    results = []
+    for config in configs:
+        started = time.perf_counter()
+        k = min(config['k'], neighbor_rows.shape[1])
+        if k > 0:
+            ranked_vectors = engine._merge_histories_batch(query_vectors, neighbor_rows[:, :k], config['alpha'], store.matrix).tocsr()
+        else:
+            ranked_vectors = query_vectors
+        predicted_items = [
+            TifuKnnEngine._top_k_sparse_items(
+                ranked_vectors.indices[ranked_vectors.indptr[i]:ranked_vectors.indptr[i + 1]],
+                ranked_vectors.data[ranked_vectors.indptr[i]:ranked_vectors.indptr[i + 1]],
+                state['topk'], engine.item_count
+            )
+            for i in range(ranked_vectors.shape[0])
+        ]
+        predicted, predicted_lengths = pad_rows(predicted_items)
+        truth, truth_lengths = state['truth']
+        per_user = ranking_metrics(predicted, predicted_lengths, truth[:, :predicted.shape[1]],
+                                   np.minimum(truth_lengths, predicted.shape[1]))
+        rank_seconds = time.perf_counter() - started
+        results.append({
+            **config,
+            **{name: round(float(np.mean(per_user[name])), 4) for name in METRIC_NAMES},
+            'vectorSeconds': round(shared['vectorSeconds'], 3),
+            'searchSeconds': round(shared['searchSeconds'], 3),
+            'rankSeconds': round(rank_seconds, 3),
+            # What the configuration would cost on its own
+            'seconds': round(shared['vectorSeconds'] + shared['searchSeconds'] + rank_seconds, 3)
+        })
+    return results
+
+
+def _sweep_vector_config_in_worker(vector_config: Dict, configs: List[Dict]) -> List[Dict]:
+    """Process pool entry point, the forked worker got the sweep state from the pool initializer"""
+    state, = worker_state()
+    return _sweep_vector_config(state, vector_config, configs)
+
+
+def sweep(engine, grid: Dict[str, Sequence], sample_size: int = 1000, workers: Optional[int] = None,
+          max_recommenders: int = -1, seed: Optional[int] = 0) -> Dict:
+    """
+    Evaluate every configuration of the grid on the same sample of val/test users
+
+    Args:
+        grid: {parameter: values}, missing parameters keep the engine's served value
+        sample_size: evaluated users (-1 for all val/test users with 2+ baskets)
+        workers: worker processes, defaults to SWEEP_WORKERS
+        max_recommenders: limit on recommender (train) users, -1 for all of them
+        seed: seed of the user sampling
+
+    Raises:
+        ValueError: invalid grid values, or no users to evaluate
+
+    Returns:
+        {'results': one row per configuration (parameters, metrics, seconds), 'sampleSize', 'timings'}
+    """
+    workers = max(1, workers or SWEEP_WORKERS)
+    timings = {}
+    started = time.perf_counter()
+    params = engine.params
+    configs = parameter_grid(grid, params)  # Invalid grids fail before any basket is loaded
+
+    history = engine.csv_data_history
+    users = [user_id for user_id in evaluation_users(engine, seed) if history.basket_count(user_id) >= 2]
+    users = users if sample_size == -1 else users[:sample_size]
+    recommenders = [str(uid) for uid in engine.keyset.get('train', []) if history.basket_count(uid) >= 2]
+    if max_recommenders > 0:
+        recommenders = recommenders[:max_recommenders]
+    if not users or not recommenders:
+        raise ValueError('No evaluation or recommender users with 2+ baskets')
+
+    truth = pad_rows([engine.ground_truth_basket(user_id) for user_id in users], width=params.topk)
+    state = {
+        'engine': engine,
+        'topk': params.topk,
+        'recommenders': BasketStructure(history, recommenders, engine.item_count),
+        'queries': BasketStructure(history, users, engine.item_count),
+        'truth': truth
+    }
+    timings['baskets'] = time.perf_counter() - started
+
+    phase_started = time.perf_counter()
+    vector_configs = {}
+    for config in configs:
+        vector_configs.setdefault(tuple(config[name] for name in VECTOR_PARAMETERS), []).append(config)
+    print(f"🔍 Sweeping {len(configs)} configurations ({len(vector_configs)} vector configurations) "
+          f"on {len(users)} users against {len(recommenders)} recommenders")
+
+    results = []
+    # Forked workers inherit the basket structures copy-on-write
+    pool = worker_pool(workers, (state,)) if len(vector_configs) > 1 else None
+    if pool is not None:
+        with pool:
+            futures = [pool.submit(_sweep_vector_config_in_worker, dict(zip(VECTOR_PARAMETERS, key)), group)
+                       for key, group in vector_configs.items()]
+            for done, future in enumerate(as_completed(futures), 1):
+                results.extend(future.result())
+                print(f"Progress: {done}/{len(vector_configs)} vector configurations")
+    else:
+        workers = 1
+        for done, (key, group) in enumerate(vector_configs.items(), 1):
+            results.extend(_sweep_vector_config(state, dict(zip(VECTOR_PARAMETERS, key)), group))
+            print(f"Progress: {done}/{len(vector_configs)} vector configurations")
+    timings['configurations'] = time.perf_counter() - phase_started
+    timings['total'] = time.perf_counter() - started
+
+    return {
+        'results': results,
+        'sampleSize': len(users),
+        'recommenders': len(recommenders),
+        'workers': workers,
+        'timings': {phase: round(seconds, 3) for phase, seconds in timings.items()}
+    }
+
+
+__all__ = ['sweep', 'parameter_grid', 'BasketStructure', 'DEFAULT_GRID', 'GRID_PARAMETERS']
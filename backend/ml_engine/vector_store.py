@@ -0,0 +1,194 @@
+# backend/ml_engine/vector_store.py
+"""
+Sparse recommender vector store
+One CSR row per recommender user plus a user_id -> row index
+
+On disk the store is a directory of raw .npy arrays (data / indices / indptr)
+plus a small user id index, opened with np.load(mmap_mode='r'), so engine
+startup is near-instant and several worker processes on one host share the
+same pages through the OS page cache instead of each holding a private copy.
+meta.json carries the stamp of the parameters the vectors were built with
+(see params.py), stores written before stamping have none.
+"""
+
+import fcntl
+import json
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+STORE_FORMAT = 'csr-npy-v1'
+STORE_ARRAYS = ('data', 'indices', 'indptr')
+USER_IDS_FILE = 'user_ids.json'
+META_FILE = 'meta.json'
+
+
+class RecommenderVectorStore:
+    """
+    Holds the pre-computed TIFUKNN vectors of all recommender users
+    as a single CSR matrix (rows = users, columns = items).
+    A typical user touches only a few hundred products, so the store
+    costs a small fraction of one dense item_count-wide array per user.
+    """
+
+    def __init__(self, user_ids: List[str], matrix: sparse.csr_matrix, stamp: Optional[Dict] = None):
+        if matrix.shape[0] != len(user_ids):
+            raise ValueError(f"Vector store mismatch: {len(user_ids)} user ids for {matrix.shape[0]} rows")
+        self.user_ids = list(user_ids)
+        self.matrix = matrix
+        self.index = {user_id: row for row, user_id in enumerate(self.user_ids)}
+        self.stamp = stamp  # {'paramsHash', 'params', 'itemCount'} of the build, None when unknown
+
+    @classmethod
+    def empty(cls, item_count: int) -> 'RecommenderVectorStore':
+        return cls([], sparse.csr_matrix((0, item_count), dtype=np.float64))
+
+    @classmethod
+    def from_vectors(cls, vectors: Iterable[Tuple[str, np.ndarray]], item_count: int) -> 'RecommenderVectorStore':
+        """
+        Build the store from (user_id, dense vector) pairs, one row at a time,
+        so that at most one dense vector is alive while building
+        """
+        user_ids = []
+        indptr = [0]
+        indices = []
+        data = []
+        for user_id, vector in vectors:
+            nonzero = np.flatnonzero(vector)
+            user_ids.append(str(user_id))
+            indices.append(nonzero.astype(np.int32))
+            data.append(vector[nonzero].astype(np.float64))
+            indptr.append(indptr[-1] + len(nonzero))
+
+        if not user_ids:
+            return cls.empty(item_count)
+
+        matrix = sparse.csr_matrix(
+            (np.concatenate(data), np.concatenate(indices), np.array(indptr, dtype=np.int64)),
+            shape=(len(user_ids), item_count)
+        )
+        return cls(user_ids, matrix)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.index
+
+    def rows(self, user_ids: Iterable[str]) -> List[int]:
+        """Row numbers of the given users, unknown users are skipped"""
+        return [self.index[user_id] for user_id in user_ids if user_id in self.index]
+
+    def vector(self, user_id: str) -> np.ndarray:
+        """Dense copy of a single user's vector"""
+        return self.matrix[self.index[user_id]].toarray().ravel()
+
+    @property
+    def item_count(self) -> int:
+        return self.matrix.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.data.nbytes + self.matrix.indices.nbytes + self.matrix.indptr.nbytes
+
+    def save(self, directory: Path, stamp: Optional[Dict] = None, extras: Optional[Callable[[Path], None]] = None):
+        """
+        Write the store as raw .npy arrays + id index, stamped with the build parameters.
+        The directory is written next to the target and swapped in at the end,
+        so readers never open a half-written store. extras(new directory) can add
+        files that must appear together with the store (its KNN index).
+        Writers of the same directory (several processes) take turns on an exclusive
+        lock file next to it, the swap of one never interleaves with another's.
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        with open(directory.with_name(f'{directory.name}.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._save_unlocked(directory, stamp, extras)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save_unlocked(self, directory: Path, stamp: Optional[Dict], extras: Optional[Callable[[Path], None]]):
+        tmp_dir = directory.with_name(f'{directory.name}.tmp-{os.getpid()}')
+        old_dir = directory.with_name(f'{directory.name}.old-{os.getpid()}')
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        # One index dtype for indices and indptr, so scipy can adopt the mapped arrays without a copy
+        index_dtype = np.int32 if max(self.matrix.nnz, self.item_count) < np.iinfo(np.int32).max else np.int64
+        np.save(tmp_dir / 'data.npy', np.ascontiguousarray(self.matrix.data, dtype=np.float64))
+        np.save(tmp_dir / 'indices.npy', np.ascontiguousarray(self.matrix.indices, dtype=index_dtype))
+        np.save(tmp_dir / 'indptr.npy', np.ascontiguousarray(self.matrix.indptr, dtype=index_dtype))
+        with open(tmp_dir / USER_IDS_FILE, 'w') as f:
+            json.dump(self.user_ids, f)
+        with open(tmp_dir / META_FILE, 'w') as f:
+            meta = {'format': STORE_FORMAT, 'shape': list(self.matrix.shape), 'nnz': int(self.matrix.nnz)}
+            if stamp or self.stamp:
+                meta['stamp'] = stamp or self.stamp
+            json.dump(meta, f)
+        if extras is not None:
+            extras(tmp_dir)
+
+        if directory.exists():
+            directory.rename(old_dir)
+        tmp_dir.rename(directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    @classmethod
+    def open(cls, directory: Path, mmap: bool = True) -> 'RecommenderVectorStore':
+        """
+        Open a persisted store. With mmap=True the CSR arrays stay on disk
+        (read-only memory maps), only the user id index is read into memory.
+        """
+        directory = Path(directory)
+        meta = cls.read_meta(directory)
+        if meta.get('format') != STORE_FORMAT:
+            raise ValueError(f"Unsupported vector store format {meta.get('format')!r} in {directory}")
+        with open(directory / USER_IDS_FILE, 'r') as f:
+            user_ids = json.load(f)
+
+        mmap_mode = 'r' if mmap else None
+        data, indices, indptr = (np.load(directory / f'{name}.npy', mmap_mode=mmap_mode) for name in STORE_ARRAYS)
+        matrix = sparse.csr_matrix((data, indices, indptr), shape=tuple(meta['shape']), copy=False)
+        return cls(user_ids, matrix, meta.get('stamp'))
+
+    @staticmethod
+    def read_meta(directory: Path) -> Dict:
+        """meta.json of a persisted store (format, shape, nnz, stamp) without opening it"""
+        with open(Path(directory) / META_FILE, 'r') as f:
+            return json.load(f)
+
+    @staticmethod
+    def exists(directory: Path) -> bool:
+        return (Path(directory) / META_FILE).exists()
+
+    @staticmethod
+    def version(directory: Path) -> Optional[int]:
+        """Identity of the persisted store (meta.json mtime), changes whenever it is replaced; None when missing"""
+        try:
+            return (Path(directory) / META_FILE).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load_legacy_pickle(cls, path: Path, item_count: int) -> 'RecommenderVectorStore':
+        """
+        Load a recommender_vectors.pkl written by earlier versions: either the
+        pickled CSR store or the original {user_id: dense vector} dict
+        """
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+
+        if isinstance(payload, dict) and 'matrix' in payload:
+            return cls(payload['user_ids'], payload['matrix'].tocsr())
+
+        return cls.from_vectors(payload.items(), item_count)
+
+
+__all__ = ['RecommenderVectorStore']
@@ -0,0 +1,54 @@
+# backend/ml_engine/workers.py
+"""
+Worker process pools of the engine's batch computations
+(vector pre-computation, evaluation, hyperparameter sweep)
+
+Workers are forked so that they inherit the engine's loaded stores
+copy-on-write instead of each loading or unpickling them, and they receive
+the engine through the pool initializer, never through a global of the
+calling process. Forking is only safe from a single-threaded process: the
+child gets every lock another thread (Flask requests, background jobs, the
+vector store watch) was holding at fork time, still locked, and can hang on
+it. Inside the running backend the computations therefore stay in process;
+the build/ CLIs get the worker pool.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+# Per worker process state set by the pool initializer (only ever set in forked children)
+_worker_state = None
+
+
+def can_fork() -> bool:
+    """Whether this process has a single thread, so a fork cannot copy a held lock"""
+    return threading.active_count() == 1
+
+
+def worker_pool(workers: int, initargs: Tuple) -> Optional[ProcessPoolExecutor]:
+    """
+    Forked pool whose workers get initargs as their worker_state(), None when the
+    work should run in process (one worker, or other threads are running)
+    """
+    if workers <= 1:
+        return None
+    if not can_fork():
+        print(f"⚠️  {threading.active_count()} threads running, computing in process instead of forking {workers} workers")
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                               initializer=_init_worker, initargs=initargs)
+
+
+def _init_worker(*state):
+    global _worker_state
+    _worker_state = state
+
+
+def worker_state() -> Tuple:
+    """initargs of the pool this worker process belongs to"""
+    return _worker_state
+
+
+__all__ = ['can_fork', 'worker_pool', 'worker_state']
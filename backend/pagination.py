@@ -0,0 +1,33 @@
+# backend/pagination.py
+"""
+Opaque cursor tokens for keyset pagination
+A token is the url-safe base64 of a small JSON object holding the sort mode and
+the sort key of the last row of the previous page
+"""
+
+import base64
+import json
+from typing import Dict
+
+
+def encode_cursor(position: Dict) -> str:
+    """Token for the position after which the next page starts"""
+    payload = json.dumps(position, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Dict:
+    """
+    Position of a token, empty for the first page
+    Raises ValueError on malformed tokens
+    """
+    if not token:
+        return {}
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Invalid cursor: {token}') from e
+    if not isinstance(position, dict):
+        raise ValueError(f'Invalid cursor: {token}')
+    return position
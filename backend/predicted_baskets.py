@@ -0,0 +1,144 @@
+# backend/predicted_baskets.py
+"""
+Materialized predictions in predicted_baskets / predicted_basket_items
+
+A stored basket is served while it is active, not expired and was computed for
+the user's current order history (order count + latest order time, kept in its
+metadata). Functions take an open cursor, so they are shared by the predictions
+endpoint (database.get_db_cursor) and the offline bulk job below.
+
+Bulk job (precompute baskets of every active user): the backend runs it as a
+'precompute-baskets' background job once it serves requests, users without a
+stored basket get the live prediction meanwhile. Offline:
+    python predicted_baskets.py
+"""
+
+import os
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import Json, RealDictCursor, execute_values
+
+from prediction_cache import PredictionCache
+
+PREDICTED_BASKET_TTL_HOURS = float(os.getenv('PREDICTED_BASKET_TTL_HOURS', '24')) # How long a stored basket stays valid
+PRECOMPUTE_BATCH_SIZE = 256 # Users per batched engine call in the bulk job
+MIN_ORDERS_FOR_PREDICTION = 3 # Same eligibility rule as /predicted-basket
+
+
+def load_stored_basket(cur, user_id: int, fingerprint) -> Optional[Tuple[str, List[int]]]:
+    """
+    Latest valid stored basket of the user as (basket_id, ranked product ids), None on miss/expiry
+    """
+    cur.execute("""
+        SELECT pb.id, pb.metadata->'orderFingerprint' as order_fingerprint,
+               array_agg(pbi.product_id ORDER BY pbi.position) as product_ids
+        FROM predicted_baskets pb
+        JOIN predicted_basket_items pbi ON pbi.basket_id = pb.id
+        WHERE pb.user_id = %s AND pb.is_active AND pb.expires_at > CURRENT_TIMESTAMP
+        GROUP BY pb.id, pb.prediction_date
+        ORDER BY pb.prediction_date DESC
+        LIMIT 1
+    """, [user_id])
+    basket = cur.fetchone()
+    if not basket or basket['order_fingerprint'] != list(fingerprint):
+        return None
+    return str(basket['id']), list(basket['product_ids'])
+
+
+def store_basket(cur, user_id: int, product_ids: List[int], fingerprint, metadata: Optional[Dict] = None) -> str:
+    """
+    Replace the user's active basket with a freshly predicted one, returns the new basket id
+    (cur must be a RealDictCursor)
+    """
+    deactivate_baskets(cur, user_id)
+    cur.execute("""
+        INSERT INTO predicted_baskets (user_id, expires_at, is_active, metadata)
+        VALUES (%s, CURRENT_TIMESTAMP + %s * INTERVAL '1 hour', true, %s)
+        RETURNING id
+    """, [user_id, PREDICTED_BASKET_TTL_HOURS, Json({**(metadata or {}), 'orderFingerprint': list(fingerprint)})])
+    basket_id = cur.fetchone()['id']
+    if product_ids:
+        execute_values(cur, """
+            INSERT INTO predicted_basket_items (basket_id, product_id, quantity, position)
+            VALUES %s
+        """, [(basket_id, product_id, 1, position) for position, product_id in enumerate(product_ids)])
+    return str(basket_id)
+
+
+def deactivate_baskets(cur, user_id: int):
+    """Retire the user's stored baskets (new order placed, or replaced by a fresh prediction)"""
+    cur.execute(
+        "UPDATE predicted_baskets SET is_active = false WHERE user_id = %s AND is_active",
+        [user_id]
+    )
+
+
+def deactivate_all_baskets(cur) -> int:
+    """Retire every stored basket (the engine now serves other parameters or vectors)"""
+    cur.execute("UPDATE predicted_baskets SET is_active = false WHERE is_active")
+    return cur.rowcount
+
+
+def precompute_baskets(conn, engine, batch_size: int = PRECOMPUTE_BATCH_SIZE,
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       cancelled: Optional[Callable[[], bool]] = None) -> Dict:
+    """
+    Bulk-precompute and store baskets of every active user with enough orders,
+    with one batched engine call per batch_size users and one commit per batch.
+    progress(done, total) is called after every batch; once cancelled() is true
+    the remaining batches are skipped.
+    """
+    started = time.perf_counter()
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT u.instacart_user_id as user_id, COUNT(o.id) as order_count,
+                   MAX(o.created_at) as latest_order_at
+            FROM users u
+            JOIN orders o ON o.user_id = u.instacart_user_id
+            WHERE u.is_active
+            GROUP BY u.instacart_user_id
+            HAVING COUNT(o.id) >= %s
+        """, [MIN_ORDERS_FOR_PREDICTION])
+        users = cur.fetchall()
+
+    stored = 0
+    failed = 0
+    for start in range(0, len(users), batch_size):
+        if cancelled is not None and cancelled():
+            break
+        batch = users[start:start + batch_size]
+        predictions = engine.predict_baskets([str(user['user_id']) for user in batch], use_csv_data=False)
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            for user in batch:
+                prediction = predictions[str(user['user_id'])]
+                if not prediction['success']:
+                    failed += 1
+                    continue
+                fingerprint = PredictionCache.fingerprint(user['order_count'], user['latest_order_at'])
+                store_basket(cur, user['user_id'], prediction['items'], fingerprint, prediction.get('metadata'))
+                stored += 1
+        conn.commit()
+        print(f"🧺 Precomputed baskets: {min(start + batch_size, len(users))}/{len(users)} users")
+        if progress is not None:
+            progress(min(start + batch_size, len(users)), len(users))
+
+    return {
+        'users': len(users),
+        'stored': stored,
+        'failed': failed,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+
+if __name__ == '__main__':
+    from ml_engine import DATABASE_CONFIG, get_engine
+
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    try:
+        summary = precompute_baskets(conn, get_engine())
+    finally:
+        conn.close()
+    print(f"✅ Stored {summary['stored']} predicted baskets for {summary['users']} active users "
+          f"({summary['failed']} failed) in {summary['seconds']}s")
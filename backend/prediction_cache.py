@@ -0,0 +1,83 @@
+# backend/prediction_cache.py
+"""
+Bounded LRU/TTL cache of per-user prediction responses
+An entry is only served while the user's order-history fingerprint
+(order count + latest orders.created_at) is unchanged
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+class PredictionCache:
+    """
+    One entry per user: (fingerprint, expiry time, cached response).
+    Least recently used users are evicted once max_size is reached.
+    Thread safe, shared by all requests of the process (app.prediction_cache).
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def fingerprint(order_count: int, latest_order_at) -> Hashable:
+        """Order-history version of a user"""
+        return (int(order_count), latest_order_at.isoformat() if latest_order_at else None)
+
+    def get(self, user_id: str, fingerprint: Hashable) -> Optional[Dict]:
+        """Cached response for the user, None when missing, expired or stale"""
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != fingerprint or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, user_id: str, fingerprint: Hashable, response: Dict):
+        if self.max_size <= 0:
+            return
+        user_id = str(user_id)
+        with self._lock:
+            self._entries[user_id] = (fingerprint, time.monotonic() + self.ttl_seconds, response)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: str):
+        """Drop the user's entry (called when the user places an order)"""
+        with self._lock:
+            if self._entries.pop(str(user_id), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxSize': self.max_size,
+                'ttlSeconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,80 @@
+# backend/upgrade_schema.py
+"""
+Schema upgrade of an existing database
+database/init.sql only runs on a fresh postgres_data volume, so the tables,
+columns and indexes added to it since are created here too (every statement
+is idempotent). Run by init_backend.sh once the database is reachable.
+"""
+
+import psycopg2
+
+from ml_engine import DATABASE_CONFIG
+
+SCHEMA_UPGRADES = [
+    # Product search (full-text document and trigram matching)
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    # Rank of stored predicted basket items
+    "ALTER TABLE predicted_basket_items ADD COLUMN IF NOT EXISTS position INTEGER DEFAULT 0",
+    # Catalog version polled by the in-memory product catalog
+    """
+    CREATE TABLE IF NOT EXISTS catalog_version (
+        id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+        version BIGINT NOT NULL DEFAULT 1,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "INSERT INTO catalog_version (id) VALUES (true) ON CONFLICT (id) DO NOTHING",
+    # Incremental user vector state
+    """
+    CREATE TABLE IF NOT EXISTS user_vectors (
+        user_id INTEGER PRIMARY KEY REFERENCES users(instacart_user_id) ON DELETE CASCADE,
+        item_ids INTEGER[] NOT NULL,
+        weights DOUBLE PRECISION[] NOT NULL,
+        basket_count INTEGER NOT NULL DEFAULT 0,
+        order_count INTEGER NOT NULL DEFAULT 0,
+        params_hash VARCHAR(16),
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_products_name_id ON products(name, instacart_product_id)",
+    "CREATE INDEX IF NOT EXISTS idx_products_price_id ON products(price, instacart_product_id)",
+    "CREATE INDEX IF NOT EXISTS idx_products_search ON products USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING GIN (name gin_trgm_ops)",
+    # idx_orders_created gained the id column (keyset pagination), an old two-column index is replaced
+    """
+    DO $$
+    BEGIN
+        IF EXISTS (
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = 'idx_orders_created' AND i.indnatts = 2
+        ) THEN
+            DROP INDEX idx_orders_created;
+        END IF;
+    END $$
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(user_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id)",
+    "CREATE INDEX IF NOT EXISTS idx_predicted_basket_items_basket ON predicted_basket_items(basket_id)",
+]
+
+
+def upgrade_schema():
+    """Apply every upgrade in one transaction"""
+    conn = psycopg2.connect(**DATABASE_CONFIG)
+    try:
+        with conn, conn.cursor() as cur:
+            for statement in SCHEMA_UPGRADES:
+                cur.execute(statement)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    upgrade_schema()
+    print("✅ Database schema up to date")
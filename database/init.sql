@@ -25,6 +25,11 @@ CREATE TABLE IF NOT EXISTS products (
     aisle_id INTEGER,
     aisle_name VARCHAR(255),
     is_active BOOLEAN DEFAULT true,
+    -- Full-text search document: name ranks above description
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -47,6 +52,9 @@ CREATE TABLE IF NOT EXISTS users (
 -- Enable UUID extension for orders and carts
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Trigram matching for partial-word product search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- Orders table (UUID primary key, references user by instacart_user_id)
 CREATE TABLE IF NOT EXISTS orders (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -129,18 +137,46 @@ CREATE TABLE IF NOT EXISTS predicted_basket_items (
     basket_id UUID NOT NULL REFERENCES predicted_baskets(id) ON DELETE CASCADE,
     product_id INTEGER NOT NULL REFERENCES products(instacart_product_id),
     quantity INTEGER DEFAULT 1,
-    confidence_score DECIMAL(3,2)
+    confidence_score DECIMAL(3,2),
+    position INTEGER DEFAULT 0 -- rank in the engine's ordering
+);
+
+-- Catalog version, bumped by every writer of products/categories (backends reload their catalog cache)
+CREATE TABLE IF NOT EXISTS catalog_version (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO catalog_version (id) VALUES (true) ON CONFLICT (id) DO NOTHING;
+
+-- User vector state (TIFUKNN decayed sum, non-zero entries only), folded forward on every new order
+-- params_hash: vector parameters the state was built with (TifuKnnParams.vector_hash)
+CREATE TABLE IF NOT EXISTS user_vectors (
+    user_id INTEGER PRIMARY KEY REFERENCES users(instacart_user_id) ON DELETE CASCADE,
+    item_ids INTEGER[] NOT NULL,
+    weights DOUBLE PRECISION[] NOT NULL,
+    basket_count INTEGER NOT NULL DEFAULT 0,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    params_hash VARCHAR(16),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_products_dept ON products(department_id);
 CREATE INDEX IF NOT EXISTS idx_products_aisle ON products(aisle_id);
+CREATE INDEX IF NOT EXISTS idx_products_name_id ON products(name, instacart_product_id);
+CREATE INDEX IF NOT EXISTS idx_products_price_id ON products(price, instacart_product_id);
+CREATE INDEX IF NOT EXISTS idx_products_search ON products USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS idx_products_name_trgm ON products USING GIN (name gin_trgm_ops);
 CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id);
-CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
 CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product_id);
 CREATE INDEX IF NOT EXISTS idx_carts_user ON carts(user_id, status);
 CREATE INDEX IF NOT EXISTS idx_favorites_user ON favorites(user_id);
 CREATE INDEX IF NOT EXISTS idx_predicted_baskets_user ON predicted_baskets(user_id, is_active);
+CREATE INDEX IF NOT EXISTS idx_predicted_basket_items_basket ON predicted_basket_items(basket_id);
 
 -- Insert default users with negative IDs
 INSERT INTO users (instacart_user_id, email, password, first_name, last_name, role, is_active, email_verified)
@@ -253,6 +253,18 @@ class DatabasePopulator:
             cur.close()
             self.put_connection(conn)
     
+    def bump_catalog_version(self):
+        """Tell running backends to reload their in-memory product catalog"""
+        conn = self.get_connection()
+        cur = conn.cursor()
+        
+        try:
+            cur.execute("UPDATE catalog_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP")
+            conn.commit()
+        finally:
+            cur.close()
+            self.put_connection(conn)
+    
     def run(self):
         """Run the complete population process"""
         print("="*60)
@@ -289,6 +301,8 @@ class DatabasePopulator:
             else:
                 print("Products already populated, skipping...")
             
+            self.bump_catalog_version()
+            
             print("\n✅ Database population complete!")
             
         except Exception as e: